@@ -1,148 +1,253 @@
 """
 Sistema de cache mejorado para respuestas con límites de tamaño
 """
+import heapq
+import logging
+import sys
 import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
 
 from config.settings import settings
 from utils.logger import logger
 from utils.text_processor import generate_cache_key
 
 
+@dataclass
+class CacheEntry:
+    """Entrada del cache de respuestas (con __slots__ para reducir memoria)"""
+    __slots__ = ('response', 'expiry', 'question_preview')
+
+    response: str
+    expiry: float  # Segundos de time.monotonic()
+    question_preview: str
+
+
 class ResponseCache:
     """Sistema de cache mejorado para respuestas de IA con límites de tamaño"""
 
     def __init__(self):
-        self.cache: Dict[str, Dict[str, Any]] = {}
+        # OrderedDict como lista doblemente enlazada + hashmap: el orden de
+        # inserción refleja el uso reciente (el primero es el menos usado)
+        self.cache: "OrderedDict[str, CacheEntry]" = OrderedDict()
         self.cache_duration = timedelta(hours=settings.CACHE_DURATION_HOURS)
+        # Las expiraciones se comparan como floats del reloj monotónico
+        self._duration_s = self.cache_duration.total_seconds()
         self.max_size = settings.MAX_CACHE_SIZE
-        self.access_times: Dict[str, float] = {}
+        # Min-heap (expiración, clave) para limpiar solo las entradas vencidas
+        self._exp_heap: List[Tuple[float, str]] = []
+        # Máximo de entradas vencidas que se limpian en cada set()
+        self._expire_batch = 4
         self.stats = {
             'hits': 0,
             'misses': 0,
             'total_requests': 0,
             'evictions': 0
         }
+        # Vista de estadísticas reutilizada por get_stats(); los porcentajes
+        # solo se recalculan cuando cambian los contadores de los que dependen
+        self._stats_view: Dict[str, Any] = {
+            'hits': 0,
+            'misses': 0,
+            'total_requests': 0,
+            'hit_rate': 0,
+            'cache_size': 0,
+            'max_size': self.max_size,
+            'usage_percent': 0.0,
+            'evictions': 0,
+            'duration_hours': settings.CACHE_DURATION_HOURS
+        }
+        self._last_total = 0
+        self._last_size = 0
+        # La instancia es global y compartida entre hilos: un solo lock
+        # protege el OrderedDict, el heap de expiración y las estadísticas
+        self.lock = Lock()
 
         logger.info(
             f"🗂️ ResponseCache inicializado: max_size={self.max_size}, duration={settings.CACHE_DURATION_HOURS}h")
 
     def get(self, question: str) -> Optional[str]:
         """Obtiene respuesta del cache si existe y es válida"""
-        cache_key = generate_cache_key(question)
-        self.stats['total_requests'] += 1
-
-        if cache_key in self.cache:
-            cached_data = self.cache[cache_key]
-
-            # Verificar si no ha expirado
-            if datetime.now() - cached_data['timestamp'] < self.cache_duration:
-                # Actualizar tiempo de acceso para LRU
-                self.access_times[cache_key] = time.time()
-                self.stats['hits'] += 1
-                logger.debug(f"✅ Cache hit para: {question[:50]}...")
-                return cached_data['response']
-            else:
-                # Expirar entrada
-                self._remove_entry(cache_key)
-
-        self.stats['misses'] += 1
-        logger.debug(f"❌ Cache miss para: {question[:50]}...")
-        return None
+        return self.get_with_key(question)[1]
+
+    def get_with_key(self, question: str) -> Tuple[str, Optional[str]]:
+        """
+        Obtiene respuesta del cache junto con su clave
+
+        La clave devuelta puede reutilizarse en set_with_key() para no
+        normalizar ni hashear la pregunta dos veces en un cache miss.
+        """
+        # Clave internada: las preguntas repetidas comparten el mismo objeto
+        # y la búsqueda en el dict se resuelve por identidad
+        cache_key = sys.intern(generate_cache_key(question))
+
+        with self.lock:
+            self.stats['total_requests'] += 1
+            cached_data = self.cache.get(cache_key)
+
+            if cached_data is not None:
+                # Verificar si no ha expirado
+                if cached_data.expiry > time.monotonic():
+                    # Marcar como usada recientemente para LRU
+                    self.cache.move_to_end(cache_key)
+                    self.stats['hits'] += 1
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug("✅ Cache hit para: %s...", question[:50])
+                    return cache_key, cached_data.response
+                else:
+                    # Expirar entrada (su presencia ya está comprobada)
+                    del self.cache[cache_key]
+
+            self.stats['misses'] += 1
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("❌ Cache miss para: %s...", question[:50])
+        return cache_key, None
 
     def set(self, question: str, response: str):
         """Guarda respuesta en el cache con gestión de tamaño"""
-        cache_key = generate_cache_key(question)
-
-        # Si el cache está lleno, eliminar el menos usado
-        if len(self.cache) >= self.max_size and cache_key not in self.cache:
-            self._evict_least_recently_used()
-
-        # Almacenar en cache
-        self.cache[cache_key] = {
-            'response': response,
-            'timestamp': datetime.now(),
-            'question': question,
-            'access_count': 1
-        }
-        self.access_times[cache_key] = time.time()
-
-        logger.debug(
-            f"💾 Respuesta cacheada: {question[:50]}... ({len(self.cache)}/{self.max_size})")
+        self.set_with_key(sys.intern(generate_cache_key(question)), question, response)
+
+    def set_with_key(self, cache_key: str, question: str, response: str):
+        """Guarda respuesta usando una clave ya calculada por get_with_key()"""
+        # Solo se guarda el extracto que muestra get_cache_contents()
+        question_preview = question[:100] + '...' if len(question) > 100 else question
+
+        with self.lock:
+            now_ts = time.monotonic()
+            # Limpieza amortizada: unas pocas entradas vencidas por escritura
+            self._pop_expired(now_ts, self._expire_batch)
+            expiry = now_ts + self._duration_s
+
+            # Almacenar en cache
+            self.cache[cache_key] = CacheEntry(
+                response=response,
+                expiry=expiry,
+                question_preview=question_preview
+            )
+            self.cache.move_to_end(cache_key)
+            heapq.heappush(self._exp_heap, (expiry, cache_key))
+            self._compact_expiration_heap()
+
+            # Si el cache está lleno, eliminar el menos usado
+            if len(self.cache) > self.max_size:
+                self._evict_least_recently_used()
+
+            cache_size = len(self.cache)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("💾 Respuesta cacheada: %s... (%d/%d)",
+                         question[:50], cache_size, self.max_size)
 
     def _evict_least_recently_used(self):
-        """Elimina la entrada menos recientemente usada"""
-        if not self.access_times:
+        """Elimina la entrada menos recientemente usada (requiere self.lock)"""
+        if not self.cache:
             return
 
-        # Encontrar la clave con el tiempo de acceso más antiguo
-        oldest_key = min(self.access_times, key=self.access_times.get)
-        self._remove_entry(oldest_key)
+        # La primera clave del OrderedDict es la menos recientemente usada
+        oldest_key, _ = self.cache.popitem(last=False)
         self.stats['evictions'] += 1
 
-        logger.debug(f"🗑️ Entrada evicted del cache (LRU): {oldest_key}")
+        logger.debug("🗑️ Entrada evicted del cache (LRU): %s", oldest_key)
+
+    def _compact_expiration_heap(self):
+        """Reconstruye el heap si acumula demasiadas entradas obsoletas (requiere self.lock)"""
+        if len(self._exp_heap) <= 2 * max(self.max_size, len(self.cache)):
+            return
 
-    def _remove_entry(self, cache_key: str):
-        """Elimina una entrada específica del cache"""
-        if cache_key in self.cache:
-            del self.cache[cache_key]
-        if cache_key in self.access_times:
-            del self.access_times[cache_key]
+        self._exp_heap = [(entry.expiry, key) for key, entry in self.cache.items()]
+        heapq.heapify(self._exp_heap)
+
+    def _pop_expired(self, now_ts: float, limit: Optional[int] = None) -> int:
+        """Elimina hasta `limit` entradas vencidas según el heap (requiere self.lock)"""
+        removed = 0
+        popped = 0
+        while self._exp_heap and self._exp_heap[0][0] <= now_ts:
+            if limit is not None and popped >= limit:
+                break
+            expiry, key = heapq.heappop(self._exp_heap)
+            popped += 1
+            entry = self.cache.get(key)
+            # Ignorar registros obsoletos (clave reescrita o ya eliminada)
+            if entry is not None and entry.expiry == expiry:
+                del self.cache[key]
+                removed += 1
+        return removed
 
     def clear(self):
         """Limpia todo el cache"""
-        self.cache.clear()
-        self.access_times.clear()
-        self.stats['evictions'] = 0
+        with self.lock:
+            self.cache.clear()
+            self._exp_heap.clear()
+            self.stats['evictions'] = 0
         logger.info("🧹 Cache limpiado completamente")
 
     def get_stats(self) -> Dict[str, Any]:
-        """Retorna estadísticas detalladas del cache"""
-        total = self.stats['hits'] + self.stats['misses']
-        hit_rate = (self.stats['hits'] / total * 100) if total > 0 else 0
-
-        return {
-            'hits': self.stats['hits'],
-            'misses': self.stats['misses'],
-            'total_requests': self.stats['total_requests'],
-            'hit_rate': round(hit_rate, 2),
-            'cache_size': len(self.cache),
-            'max_size': self.max_size,
-            'usage_percent': round((len(self.cache) / self.max_size) * 100, 2),
-            'evictions': self.stats['evictions'],
-            'duration_hours': settings.CACHE_DURATION_HOURS
-        }
+        """
+        Retorna estadísticas detalladas del cache
+
+        El diccionario devuelto es una vista compartida que se actualiza en
+        cada llamada; debe tratarse como de solo lectura.
+        """
+        with self.lock:
+            view = self._stats_view
+            hits, misses = self.stats['hits'], self.stats['misses']
+            view['hits'] = hits
+            view['misses'] = misses
+            view['total_requests'] = self.stats['total_requests']
+            view['evictions'] = self.stats['evictions']
+
+            total = hits + misses
+            if total != self._last_total:
+                self._last_total = total
+                view['hit_rate'] = round(hits / total * 100, 2) if total > 0 else 0
+
+            cache_size = len(self.cache)
+            if cache_size != self._last_size or view['max_size'] != self.max_size:
+                self._last_size = cache_size
+                view['cache_size'] = cache_size
+                view['max_size'] = self.max_size
+                view['usage_percent'] = round((cache_size / self.max_size) * 100, 2)
+
+            return view
 
     def cleanup_expired(self):
-        """Limpia entradas expiradas del cache"""
-        now = datetime.now()
-        expired_keys = [
-            key for key, data in self.cache.items()
-            if now - data['timestamp'] > self.cache_duration
-        ]
+        """
+        Limpia todas las entradas expiradas del cache
 
-        for key in expired_keys:
-            self._remove_entry(key)
+        set() ya retira unas pocas en cada escritura, por lo que no hace falta
+        invocarlo periódicamente; sigue disponible para una limpieza completa.
+        """
+        with self.lock:
+            # Solo se recorren las entradas vencidas: O(k log n)
+            expired_count = self._pop_expired(time.monotonic())
 
-        if expired_keys:
+        if expired_count:
             logger.info(
-                f"🧹 Limpiadas {len(expired_keys)} entradas expiradas del cache")
+                f"🧹 Limpiadas {expired_count} entradas expiradas del cache")
 
-        return len(expired_keys)
+        return expired_count
 
     def get_cache_contents(self) -> Dict[str, Any]:
         """Obtiene el contenido del cache para inspección"""
+        with self.lock:
+            entries = list(self.cache.values())
+
+        # Convertir la expiración monotónica a la hora de inserción real
+        now, now_ts = datetime.now(), time.monotonic()
         return {
             'entries': [
                 {
-                    'question': data['question'][:100] + '...' if len(data['question']) > 100 else data['question'],
-                    'timestamp': data['timestamp'].isoformat(),
-                    'response_length': len(data['response'])
+                    'question': entry.question_preview,
+                    'timestamp': (now - timedelta(seconds=now_ts - entry.expiry + self._duration_s)).isoformat(),
+                    'response_length': len(entry.response)
                 }
-                for data in self.cache.values()
+                for entry in entries
             ],
-            'total_entries': len(self.cache)
+            'total_entries': len(entries)
         }
 
 
@@ -2,6 +2,11 @@
 Manejador de respuestas por defecto
 SIMPLIFICADO - Proxy directo a base de datos SQLite con normalización de texto
 """
+import re
+from functools import lru_cache
+from typing import Callable, Optional
+
+from ai.intent_detector import detect_intent
 
 # Importar todas las funciones directamente desde la base de datos
 from database.fallback_main import (
@@ -17,36 +22,21 @@ from database.fallback_main import (
     get_smart_welcome_response,
 )
 from utils.logger import logger
-from utils.text_processor import normalize_text
+from utils.text_processor import KeywordMatcher, normalize_text
 
 logger.info(
     "🗄️ Fallback handler usando base de datos SQLite con normalización de texto")
 
-
-def generate_fallback_response(question: str) -> str:
-    """
-    Genera una respuesta de fallback usando la base de datos
-    con normalización de texto para mejorar la coincidencia
-    """
-    # Normalizar el texto para una mejor coincidencia
-    normalized_question = normalize_text(question)
-
-    # Detectar consultas sobre precios específicos
-    price = extract_price_from_query(question)
-    if price > 0:
-        return get_room_by_price(price)
-
-    # Detectar consultas específicas sobre reservas
-    reservation_keywords = [
+# Palabras clave por categoría (ya normalizadas), en orden de prioridad
+_FALLBACK_KEYWORDS = {
+    # Consultas específicas sobre reservas
+    'reservation': (
         'reserva', 'reservar', 'reservacion', 'booking', 'book',
         'quiero reservar', 'hacer reserva', 'como reservar',
         'informacion reservas', 'contacto reservas'
-    ]
-    if any(keyword in normalized_question for keyword in reservation_keywords):
-        return get_reservation_info()
-
-    # Detectar consultas específicas sobre habitaciones más baratas
-    cheap_keywords = [
+    ),
+    # Consultas específicas sobre habitaciones más baratas
+    'cheap': (
         'habitacion mas barata', 'cuarto mas barato', 'room mas barato',
         'habitacion economica', 'cuarto economico', 'habitacion barata',
         'cuarto barato', 'room barato', 'la mas barata', 'el mas barato',
@@ -54,12 +44,9 @@ def generate_fallback_response(question: str) -> str:
         'cual es la mas barata', 'cual es el mas barato', 'la barata',
         'el barato', 'mas barata', 'mas barato', 'cual barata',
         'que barata', 'habitaciones baratas', 'cuartos baratos'
-    ]
-    if any(keyword in normalized_question for keyword in cheap_keywords):
-        return get_cheapest_room_info()
-
-    # Detectar consultas específicas sobre habitaciones más caras
-    expensive_keywords = [
+    ),
+    # Consultas específicas sobre habitaciones más caras
+    'expensive': (
         'habitacion mas cara', 'cuarto mas caro', 'room mas caro',
         'habitacion lujosa', 'cuarto lujoso', 'habitacion cara',
         'cuarto caro', 'room caro', 'la mas cara', 'el mas caro',
@@ -68,34 +55,113 @@ def generate_fallback_response(question: str) -> str:
         'cual es la cara', 'cual es la mas cara', 'cual es el mas caro',
         'la cara', 'el caro', 'mas cara', 'mas caro', 'cual cara',
         'que cara', 'habitaciones caras', 'cuartos caros', 'lujosa'
-    ]
-    if any(keyword in normalized_question for keyword in expensive_keywords):
-        return get_most_expensive_room_info()
-
+    ),
     # Consultas generales sobre habitaciones
-    room_keywords = ['habitacion', 'cuarto', 'room', 'alojamiento', 'dormitorio', 'cama']
-    if any(keyword in normalized_question for keyword in room_keywords):
-        return get_room_info_from_documents()
-
+    'room': ('habitacion', 'cuarto', 'room', 'alojamiento', 'dormitorio', 'cama'),
     # Consultas sobre restaurantes y comida
-    restaurant_keywords = ['restaurante', 'comida', 'restaurant', 'menu', 'gastronomia', 'cena', 'almuerzo', 'desayuno']
-    if any(keyword in normalized_question for keyword in restaurant_keywords):
-        return get_restaurant_info_from_documents()
-
+    'restaurant': (
+        'restaurante', 'comida', 'restaurant', 'menu', 'gastronomia',
+        'cena', 'almuerzo', 'desayuno'
+    ),
     # Consultas sobre amenidades
-    amenity_keywords = ['amenidad', 'piscina', 'spa', 'actividad', 'gimnasio', 'servicio', 'entretenimiento']
-    if any(keyword in normalized_question for keyword in amenity_keywords):
-        return get_amenities_info_from_documents()
-
+    'amenity': (
+        'amenidad', 'piscina', 'spa', 'actividad', 'gimnasio', 'servicio',
+        'entretenimiento'
+    ),
     # Consultas sobre contacto
-    contact_keywords = ['contacto', 'telefono', 'email', 'llamar', 'direccion', 'ubicacion']
-    if any(keyword in normalized_question for keyword in contact_keywords):
-        return get_contact_info_from_documents()
+    'contact': ('contacto', 'telefono', 'email', 'llamar', 'direccion', 'ubicacion'),
+}
+
+# Todas las palabras clave se buscan en una sola pasada sobre la pregunta
+_FALLBACK_MATCHER = KeywordMatcher(_FALLBACK_KEYWORDS)
+
+# Tabla de despacho categoría -> función de respuesta (sin argumentos)
+_CATEGORY_HANDLERS = {
+    'reservation': get_reservation_info,
+    'cheap': get_cheapest_room_info,
+    'expensive': get_most_expensive_room_info,
+    'room': get_room_info_from_documents,
+    'restaurant': get_restaurant_info_from_documents,
+    'amenity': get_amenities_info_from_documents,
+    'contact': get_contact_info_from_documents,
+}
+
+
+# Pre-chequeo barato: sin dígitos no puede haber un precio que extraer
+_HAS_DIGIT = re.compile(r'\d').search
+
+# Normalización memoizada: las preguntas repetidas no se vuelven a procesar
+_normalize_question = lru_cache(maxsize=4096)(normalize_text)
+
+
+@lru_cache(maxsize=4096)
+def _resolve_handler(normalized_question: str) -> Optional[Callable[[], str]]:
+    """
+    Clasifica la pregunta normalizada y retorna su función de respuesta
+
+    Memoizado: clasificación y despacho se resuelven en una sola búsqueda
+    para las preguntas repetidas. None indica que no hubo coincidencias.
+    """
+    category = _FALLBACK_MATCHER.first_category(normalized_question)
+    return _CATEGORY_HANDLERS.get(category)
+
+
+def generate_fallback_response(question: str) -> str:
+    """
+    Genera una respuesta de fallback usando la base de datos
+    con normalización de texto para mejorar la coincidencia
+    """
+    # Normalizar el texto para una mejor coincidencia
+    normalized_question = _normalize_question(question)
+
+    # Detectar consultas sobre precios específicos
+    if _HAS_DIGIT(question):
+        price = extract_price_from_query(question)
+        if price > 0:
+            return get_room_by_price(price)
+
+    # Función de la categoría de mayor prioridad entre las palabras clave
+    handler = _resolve_handler(normalized_question)
+    if handler is not None:
+        return handler()
 
     # Respuesta por defecto
     return get_smart_welcome_response(question)
 
 
+# Intenciones con respuesta determinista desde la BD: si la pregunta las
+# menciona con claridad (varios patrones de la intención), no hace falta
+# buscar contexto ni ejecutar el generador
+_TEMPLATE_INTENT_HANDLERS = {
+    'economic_room': get_cheapest_room_info,
+    'expensive_room': get_most_expensive_room_info,
+    'contact': get_contact_info_from_documents,
+}
+_TEMPLATE_MIN_SCORE = 2
+
+
+def get_template_response(question: str) -> Optional[str]:
+    """
+    Retorna la respuesta directa de la BD para preguntas de intención clara
+
+    None si la pregunta necesita al generador de IA.
+    """
+    # Consultas sobre un precio concreto
+    if _HAS_DIGIT(question):
+        price = extract_price_from_query(question)
+        if price > 0:
+            return get_room_by_price(price)
+
+    intent, score = detect_intent(question)
+    if score >= _TEMPLATE_MIN_SCORE:
+        handler = _TEMPLATE_INTENT_HANDLERS.get(intent)
+        if handler is not None:
+            logger.info(f"⚡ Respuesta directa por plantilla: {intent} (score: {score})")
+            return handler()
+
+    return None
+
+
 def get_welcome_info_from_documents() -> str:
     """Alias para compatibilidad"""
     return get_smart_welcome_response()
@@ -125,6 +191,7 @@ def get_most_expensive_room_info_fallback() -> str:
 # Exportar las funciones importadas para que estén disponibles
 __all__ = [
     'generate_fallback_response',
+    'get_template_response',
     'get_welcome_info_from_documents',
     'handle_fallback',
     'get_smart_welcome_response_fallback',
@@ -1,13 +1,225 @@
 """
 Gestión de modelos de IA con carga perezosa y gestión de recursos
 """
+import asyncio
 import os
+import unicodedata
+from collections import OrderedDict
+from functools import partial
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+# Hilos de CPU para PyTorch/oneDNN: uno por núcleo físico (la mitad de los
+# lógicos con SMT). OpenMP/MKL leen estas variables al importar torch; las ya
+# definidas en el entorno tienen prioridad
+_CPU_THREADS = max(1, (os.cpu_count() or 2) // 2)
+os.environ.setdefault("OMP_NUM_THREADS", str(_CPU_THREADS))
+os.environ.setdefault("MKL_NUM_THREADS", str(_CPU_THREADS))
+os.environ.setdefault("MKL_DYNAMIC", "FALSE")
+os.environ.setdefault("KMP_BLOCKTIME", "1")
+os.environ.setdefault("KMP_AFFINITY", "granularity=fine,compact,1,0")
+
+import torch  # noqa: E402
+from ai.resource_manager import inference_pool  # noqa: E402
+from config.settings import settings  # noqa: E402
+from langchain_core.embeddings import Embeddings  # noqa: E402
+from langchain_huggingface import HuggingFaceEmbeddings  # noqa: E402
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline  # noqa: E402
+from utils.logger import logger  # noqa: E402
+
+# Por si torch ya se había importado antes que este módulo
+torch.set_num_threads(int(os.environ["OMP_NUM_THREADS"]))
+try:
+    # El paralelismo útil está dentro de cada matmul (intra-op), no entre operaciones
+    torch.set_num_interop_threads(1)
+except RuntimeError:
+    # Solo se puede fijar antes del primer trabajo paralelo de torch
+    pass
+torch.backends.mkldnn.enabled = True
+
+
+def _cpu_supports_bf16() -> bool:
+    """Indica si la CPU tiene instrucciones BF16 nativas (AVX-512 BF16 / AMX)"""
+    for check in ("_is_avx512_bf16_supported", "_is_amx_tile_supported"):
+        supported = getattr(torch.cpu, check, None)
+        if supported is not None and supported():
+            return True
+    return False
+
+
+# En CPUs con BF16 nativo las matmuls en BF16 rinden ~2x que en FP32
+CPU_DTYPE = torch.bfloat16 if _cpu_supports_bf16() else torch.float32
+
+# ONNX Runtime (opcional): modelos exportados a ONNX y cuantizados a INT8
+try:
+    from optimum.onnxruntime import (ORTModelForCausalLM,
+                                     ORTModelForSequenceClassification,
+                                     ORTQuantizer)
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+GENERATOR_MODEL = "datificate/gpt2-small-spanish"
+# MiniLM destilado (multilingüe, NLI de 6 capas) en lugar de bart-large-mnli (12+12 capas)
+INTENT_CLASSIFIER_MODEL = "MoritzLaurer/multilingual-MiniLMv2-L6-mnli-xnli"
+
+# Modelos que usa el bot al responder y que conviene precargar al arrancar
+WARMUP_MODELS = ("embeddings", "generator")
+
+# Consultas distintas (normalizadas) cuyo embedding se conserva en memoria
+QUERY_EMBEDDING_CACHE_SIZE = 1024
+
+
+def _query_cache_key(text: str) -> str:
+    """
+    Clave del LRU de embeddings: NFKD, minúsculas, sin signos de puntuación y
+    con los espacios colapsados. Las marcas diacríticas se conservan, así que
+    "año" y "ano" o "té" y "te" no comparten embedding
+    """
+    text = unicodedata.normalize('NFKD', text).lower()
+    text = ''.join(' ' if unicodedata.category(char).startswith('P') else char
+                   for char in text)
+    return ' '.join(text.split())
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Envuelve un modelo de embeddings con un LRU para las consultas
+
+    Las preguntas frecuentes ("¿Cuál es el wifi?") se repiten mucho: la clave
+    es la pregunta normalizada, así que sus variantes de mayúsculas, espacios
+    o puntuación reutilizan el embedding ya calculado en vez de ejecutar el
+    transformer otra vez.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_size: int = QUERY_EMBEDDING_CACHE_SIZE,
+                 symmetric: bool = False):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        # True si el modelo codifica las consultas igual que los documentos:
+        # entonces varias consultas nuevas se calculan en un solo lote
+        self.symmetric = symmetric
+        # OrderedDict como LRU: el primero es el menos usado
+        self._cache: "OrderedDict[str, Tuple[float, ...]]" = OrderedDict()
+        self._lock = Lock()
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embedding de una consulta, reutilizado si ya se calculó"""
+        return self.embed_queries([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings de varias consultas: las ya calculadas salen del LRU"""
+        keys = [_query_cache_key(text) or text for text in texts]
+        found: Dict[str, Tuple[float, ...]] = {}
+        with self._lock:
+            for key in keys:
+                embedding = self._cache.get(key)
+                if embedding is not None:
+                    self._cache.move_to_end(key)
+                    found[key] = embedding
+
+        # Una sola vez por clave, aunque lleguen varias variantes de la pregunta
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                missing.setdefault(key, text)
+
+        if missing:
+            # El modelo se ejecuta fuera del lock para no serializar las consultas
+            missing_texts = list(missing.values())
+            if self.symmetric and len(missing_texts) > 1:
+                computed = self.embeddings.embed_documents(missing_texts)
+            else:
+                computed = [self.embeddings.embed_query(text) for text in missing_texts]
+
+            with self._lock:
+                for key, embedding in zip(missing, computed):
+                    found[key] = self._cache[key] = tuple(embedding)
+                    self._cache.move_to_end(key)
+                    if len(self._cache) > self.max_size:
+                        self._cache.popitem(last=False)
+
+        return [list(found[key]) for key in keys]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings de documentos (sin cache: se calculan una vez por índice)"""
+        return self.embeddings.embed_documents(texts)
+
+    def __getattr__(self, name):
+        # Atributos del modelo envuelto (model_name, client, ...). Antes de
+        # __init__ (copy/pickle) no hay modelo: AttributeError, no KeyError
+        embeddings = self.__dict__.get('embeddings')
+        if embeddings is None:
+            raise AttributeError(name)
+        return getattr(embeddings, name)
+
+
+class GeneratorBatcher:
+    """
+    Agrupa las peticiones concurrentes en una sola llamada a `run_batch`
+
+    La primera petición abre una ventana de `max_wait_ms`; las que llegan
+    mientras tanto se ejecutan en el mismo lote (hasta `max_batch`). Con GPT-2
+    en CPU el coste está dominado por leer los pesos, así que un lote de 8
+    cuesta poco más que uno de 1. El lote se ejecuta en el pool de inferencia
+    compartido para no bloquear el event loop. `run_batch` se fija al crear el
+    batcher: todo lo que dependa de cada petición (p. ej. el modelo) debe ir
+    en el propio elemento encolado.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]],
+                 max_batch: int = 8, max_wait_ms: int = 20, executor=None):
+        self.run_batch = run_batch
+        self.executor = executor or inference_pool
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # Referencias a los lotes en curso: el event loop solo guarda
+        # referencias débiles y una tarea sin referencia puede recolectarse
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, item: Any) -> Any:
+        """Encola un elemento y espera su resultado"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """Despacha los elementos pendientes como un lote"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[Any, asyncio.Future]]):
+        """Ejecuta el lote en un hilo y reparte los resultados"""
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.run_batch, [item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
 
-import torch
-from config.settings import settings
-from langchain_huggingface import HuggingFaceEmbeddings
-from transformers import AutoModelForSeq2SeqLM, AutoTokenizer, pipeline
-from utils.logger import logger
 
 # Import condicional del resource manager
 def get_resource_manager():
@@ -25,6 +237,45 @@ def get_resource_manager():
 class ModelFactory:
     """Factory para crear instancias de modelos"""
 
+    @staticmethod
+    def _enable_batching(generator):
+        """Configura el tokenizer de GPT-2 (sin token de padding) para lotes"""
+        tokenizer = generator.tokenizer
+        if tokenizer.pad_token_id is None:
+            tokenizer.pad_token_id = tokenizer.eos_token_id
+        # En modelos causales el padding va a la izquierda, junto al inicio
+        tokenizer.padding_side = "left"
+        # Resuelto una sola vez aquí en lugar de en cada generación
+        generator.pad_token_id = tokenizer.eos_token_id
+        return generator
+
+    @staticmethod
+    def _load_quantized_onnx(model_class, model_name: str):
+        """
+        Carga un modelo exportado a ONNX con pesos cuantizados a INT8
+
+        La exportación y la cuantización dinámica solo se hacen la primera
+        vez; el resultado queda en settings.ONNX_MODELS_DIR para los
+        siguientes arranques.
+        """
+        quantized_dir = settings.ONNX_MODELS_DIR / model_name.replace('/', '__')
+        quantized_file = "model_quantized.onnx"
+
+        if not (quantized_dir / quantized_file).exists():
+            logger.info(f"⏳ Exportando {model_name} a ONNX INT8 (solo la primera vez)...")
+            export_dir = quantized_dir / "fp32"
+            model_class.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+
+            # Cuantización dinámica: pesos INT8, activaciones cuantizadas al vuelo
+            quantizer = ORTQuantizer.from_pretrained(export_dir, file_name="model.onnx")
+            qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+            quantizer.quantize(save_dir=quantized_dir, quantization_config=qconfig)
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(quantized_dir)
+
+        model = model_class.from_pretrained(quantized_dir, file_name=quantized_file)
+        tokenizer = AutoTokenizer.from_pretrained(quantized_dir)
+        return model, tokenizer
+
     @staticmethod
     def create_summarizer():
         """Crea el modelo resumidor"""
@@ -33,7 +284,8 @@ class ModelFactory:
                 return lambda *args, **kwargs: [{"summary_text": "Resumen dummy."}]
 
             device = "cpu"
-            torch_dtype = torch.float32
+            # quantize_dynamic parte de pesos FP32
+            torch_dtype = torch.float32 if settings.QUANTIZE_MODELS else CPU_DTYPE
             model_name = "mrm8488/bert2bert_shared-spanish-finetuned-summarization"
 
             tokenizer = AutoTokenizer.from_pretrained(model_name)
@@ -43,6 +295,12 @@ class ModelFactory:
                 device_map=None,
                 load_in_8bit=False
             )
+            if settings.QUANTIZE_MODELS:
+                # Pesos de las capas lineales en INT8: en CPU el seq2seq está
+                # limitado por el ancho de banda de memoria de esas matrices
+                model = torch.quantization.quantize_dynamic(
+                    model, {torch.nn.Linear}, dtype=torch.qint8)
+                logger.info("⚡ Resumidor cuantizado a INT8")
             return pipeline(
                 "summarization",
                 model=model,
@@ -60,15 +318,40 @@ class ModelFactory:
             if os.environ.get("USE_DUMMY_MODELS"):
                 return lambda *args, **kwargs: [{"generated_text": "Respuesta dummy."}]
 
+            # Preferir el modelo ONNX INT8: la generación autorregresiva en CPU
+            # está dominada por las multiplicaciones de matrices
+            if settings.USE_ONNX_MODELS and ONNX_AVAILABLE:
+                try:
+                    model, tokenizer = ModelFactory._load_quantized_onnx(
+                        ORTModelForCausalLM, GENERATOR_MODEL)
+                    logger.info("⚡ Generador ONNX INT8 cargado")
+                    return ModelFactory._enable_batching(pipeline(
+                        "text-generation",
+                        model=model,
+                        tokenizer=tokenizer
+                    ))
+                except Exception as e:
+                    logger.warning(
+                        f"⚠️ Generador ONNX no disponible, usando PyTorch: {e}")
+
             device = "cpu"
-            torch_dtype = torch.float32
+            torch_dtype = CPU_DTYPE
 
-            return pipeline(
+            generator = pipeline(
                 "text-generation",
-                model="datificate/gpt2-small-spanish",
+                model=GENERATOR_MODEL,
                 device=device,
                 torch_dtype=torch_dtype
             )
+            # Reutilizar las claves/valores de atención de los tokens previos
+            generator.model.config.use_cache = True
+            if settings.COMPILE_MODELS and hasattr(torch, "compile"):
+                # Se compila forward(), que es lo que generate() ejecuta en
+                # cada token; compilar el módulo no afectaría a generate()
+                generator.model.forward = torch.compile(
+                    generator.model.forward, dynamic=True)
+                logger.info("⚡ Generador compilado con torch.compile")
+            return ModelFactory._enable_batching(generator)
         except Exception as e:
             logger.warning(f"No se pudo cargar el modelo de generación: {e}")
             return lambda *args, **kwargs: [{"generated_text": "Respuesta no disponible."}]
@@ -80,10 +363,12 @@ class ModelFactory:
             if os.environ.get("USE_DUMMY_MODELS"):
                 return None
 
-            return HuggingFaceEmbeddings(
+            # Sin instrucciones de consulta, HuggingFaceEmbeddings codifica las
+            # consultas igual que los documentos (symmetric)
+            return CachedQueryEmbeddings(HuggingFaceEmbeddings(
                 model_name=settings.MODELO_EMBEDDINGS,
                 model_kwargs={'device': "cpu"}
-            )
+            ), symmetric=True)
         except Exception as e:
             logger.warning(f"No se pudo cargar el modelo de embeddings: {e}")
             return None
@@ -95,12 +380,26 @@ class ModelFactory:
             if os.environ.get("USE_DUMMY_MODELS"):
                 return lambda *args, **kwargs: [{"label": "general", "score": 1.0}]
 
+            if settings.USE_ONNX_MODELS and ONNX_AVAILABLE:
+                try:
+                    model, tokenizer = ModelFactory._load_quantized_onnx(
+                        ORTModelForSequenceClassification, INTENT_CLASSIFIER_MODEL)
+                    logger.info("⚡ Clasificador de intenciones ONNX INT8 cargado")
+                    return pipeline(
+                        "text-classification",
+                        model=model,
+                        tokenizer=tokenizer
+                    )
+                except Exception as e:
+                    logger.warning(
+                        f"⚠️ Clasificador ONNX no disponible, usando PyTorch: {e}")
+
             device = "cpu"
-            torch_dtype = torch.float32
+            torch_dtype = CPU_DTYPE
 
             return pipeline(
                 "text-classification",
-                model="facebook/bart-large-mnli",
+                model=INTENT_CLASSIFIER_MODEL,
                 device=device,
                 torch_dtype=torch_dtype,
                 load_in_8bit=False
@@ -121,10 +420,35 @@ class AIModels:
         if self.use_lazy_loading:
             self._register_models()
             logger.info("🔄 Modelos registrados para carga perezosa")
+            if settings.WARMUP_ON_START:
+                self.resource_manager.warmup(WARMUP_MODELS)
         else:
             self._load_models_immediately()
             logger.info("⚡ Modelos cargados inmediatamente")
 
+        # El modo de carga no cambia: cada getter async se resuelve una sola
+        # vez aquí en lugar de comprobar use_lazy_loading en cada petición
+        self.get_resumidor = self._model_getter("summarizer", "resumidor")
+        self.get_generador = self._model_getter("generator", "generador")
+        self.get_embedding_model = self._model_getter("embeddings", "embedding_model")
+        self.get_intent_classifier = self._model_getter(
+            "intent_classifier", "intent_classifier")
+
+    def _model_getter(self, model_name: str, attribute: str) -> Callable:
+        """
+        Crea el getter async de un modelo según el modo de carga
+
+        Con carga perezosa delega en resource_manager.get_model(); en modo
+        inmediato retorna el atributo ya cargado.
+        """
+        if self.use_lazy_loading:
+            return partial(self.resource_manager.get_model, model_name)
+
+        async def get_loaded_model():
+            return getattr(self, attribute)
+
+        return get_loaded_model
+
     def _register_models(self):
         """Registra modelos para carga perezosa"""
         if self.resource_manager:
@@ -169,30 +493,6 @@ class AIModels:
             self.embedding_model = None
             logger.info("🔄 Usando modelos dummy como fallback")
 
-    async def get_resumidor(self):
-        """Retorna el modelo resumidor (con carga perezosa si está habilitada)"""
-        if self.use_lazy_loading and self.resource_manager:
-            return await self.resource_manager.get_model("summarizer")
-        return self.resumidor
-
-    async def get_generador(self):
-        """Retorna el modelo generador (con carga perezosa si está habilitada)"""
-        if self.use_lazy_loading and self.resource_manager:
-            return await self.resource_manager.get_model("generator")
-        return self.generador
-
-    async def get_embedding_model(self):
-        """Retorna el modelo de embeddings (con carga perezosa si está habilitada)"""
-        if self.use_lazy_loading and self.resource_manager:
-            return await self.resource_manager.get_model("embeddings")
-        return self.embedding_model
-
-    async def get_intent_classifier(self):
-        """Retorna el clasificador de intenciones (con carga perezosa si está habilitada)"""
-        if self.use_lazy_loading and self.resource_manager:
-            return await self.resource_manager.get_model("intent_classifier")
-        return self.intent_classifier
-
     # Métodos síncronos para compatibilidad hacia atrás
     def get_resumidor_sync(self):
         """Versión síncrona - solo para carga inmediata"""
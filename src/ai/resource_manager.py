@@ -2,14 +2,23 @@
 Gestión de recursos y carga perezosa de modelos de IA
 """
 import asyncio
+import os
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 from threading import Lock
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Iterable, Optional
 
 from config.settings import settings
 from utils.logger import logger
 
+# Pools de hilos compartidos por todo el proceso (los hilos se crean bajo
+# demanda). Las cargas de modelos son pocas pero pesadas: como máximo dos a la
+# vez para que no compitan por todos los núcleos. La inferencia usa su propio
+# pool, así una carga en curso no ocupa los hilos de las respuestas.
+model_load_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="model-load")
+inference_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                                    thread_name_prefix="inference")
+
 
 class ModelCache:
     """Cache inteligente para modelos de IA con límites de tamaño"""
@@ -75,7 +84,9 @@ class ConcurrencyManager:
     def __init__(self, max_concurrent: int = None):
         self.max_concurrent = max_concurrent or settings.MAX_CONCURRENT_REQUESTS
         self.semaphore = asyncio.Semaphore(self.max_concurrent)
-        self.thread_pool = ThreadPoolExecutor(max_workers=self.max_concurrent)
+        # El semáforo limita las peticiones; los pools son los compartidos
+        self.thread_pool = inference_pool
+        self.load_pool = model_load_pool
         self.active_requests = 0
         self.total_requests = 0
         self.lock = Lock()
@@ -117,8 +128,11 @@ class LazyModelLoader:
     def __init__(self):
         self.cache = ModelCache() if settings.ENABLE_MODEL_CACHING else None
         self.concurrency_manager = ConcurrencyManager()
-        self.loading_locks: Dict[str, Lock] = {}
+        # asyncio.Lock por modelo: se mantiene mientras se espera la carga
+        self.loading_locks: Dict[str, asyncio.Lock] = {}
         self.models_registry: Dict[str, Dict[str, Any]] = {}
+        # Precargas en segundo plano lanzadas por warmup()
+        self.warmup_futures: Dict[str, Future] = {}
 
         logger.info("🚀 LazyModelLoader inicializado:")
         logger.info(f"  - Cache habilitado: {settings.ENABLE_MODEL_CACHING}")
@@ -147,16 +161,64 @@ class LazyModelLoader:
         # Si no está en cache, cargar
         return await self._load_model(model_name)
 
+    def warmup(self, model_names: Iterable[str]):
+        """
+        Precarga modelos en segundo plano, sin esperar a la primera petición
+
+        Cada carga se envía al pool de hilos; get_model() espera la precarga
+        en curso en lugar de repetirla.
+        """
+        for model_name in model_names:
+            if model_name in self.models_registry and model_name not in self.warmup_futures:
+                self.warmup_futures[model_name] = self.concurrency_manager.load_pool.submit(
+                    self._warmup_model, model_name)
+                logger.info(f"🔥 Precarga de {model_name} iniciada en segundo plano")
+
+    def _warmup_model(self, model_name: str) -> Any:
+        """
+        Carga un modelo en el hilo de precarga (ejecutado en hilo separado)
+
+        No necesita el lock de carga: _load_model() espera esta precarga
+        antes de intentar cargar el modelo por su cuenta.
+        """
+        model_info = self.models_registry[model_name]
+        if model_info['loaded'] and model_info['instance']:
+            return model_info['instance']
+
+        start_time = time.time()
+        model_instance = self._instantiate_model(model_name)
+        logger.info(
+            f"✅ Modelo {model_name} precargado en {time.time() - start_time:.2f}s")
+
+        model_info['loaded'] = True
+        model_info['instance'] = model_instance
+        if self.cache:
+            self.cache.put(model_name, model_instance)
+
+        return model_instance
+
     async def _load_model(self, model_name: str) -> Any:
         """Carga un modelo de forma thread-safe"""
         if model_name not in self.models_registry:
             raise ValueError(f"Modelo {model_name} no registrado")
 
-        # Lock por modelo para evitar cargas duplicadas
-        if model_name not in self.loading_locks:
-            self.loading_locks[model_name] = Lock()
+        # Si hay una precarga en curso, esperarla sin bloquear el event loop
+        warmup_future = self.warmup_futures.get(model_name)
+        if warmup_future is not None:
+            try:
+                await asyncio.wrap_future(warmup_future)
+            except Exception:
+                # La precarga falló: se reintenta con la carga normal
+                pass
+
+        # Lock por modelo para evitar cargas duplicadas. Es un asyncio.Lock
+        # porque se mantiene durante un await: un lock de hilos bloquearía
+        # el event loop mientras otra corrutina carga el mismo modelo
+        loading_lock = self.loading_locks.get(model_name)
+        if loading_lock is None:
+            loading_lock = self.loading_locks[model_name] = asyncio.Lock()
 
-        with self.loading_locks[model_name]:
+        async with loading_lock:
             model_info = self.models_registry[model_name]
 
             # Verificar si ya fue cargado por otro hilo
@@ -174,7 +236,7 @@ class LazyModelLoader:
                 # Cargar modelo en hilo separado para no bloquear
                 loop = asyncio.get_event_loop()
                 model_instance = await loop.run_in_executor(
-                    self.concurrency_manager.thread_pool,
+                    self.concurrency_manager.load_pool,
                     self._instantiate_model,
                     model_name
                 )
@@ -1,52 +1,156 @@
 """
 Generación de texto con IA
 """
-from typing import List
-
+import asyncio
+import re
+import time
+from collections import Counter
+from functools import partial
+from typing import Any, AsyncIterator, Dict, Iterable, List, Tuple
+
+import torch
+from transformers import TextIteratorStreamer
 from utils.logger import logger
 
-from .fallback_handler import generate_fallback_response
-from .models import ai_models  # Reactivado para usar modelos de IA
+from .fallback_handler import generate_fallback_response, get_template_response
+from .models import GeneratorBatcher, ai_models  # Reactivado para usar modelos de IA
+from .resource_manager import inference_pool
+
+# Caracteres del contexto que se incluyen en el prompt
+_CONTEXT_CHARS = 300
+
+# Palabras de la respuesta (se comparan como palabras completas, no como
+# subcadenas: "modelo" no debe coincidir con "model")
+_WORD_RE = re.compile(r'\w+')
+
+# Palabras que indican un error o contenido inapropiado en la respuesta
+_INAPPROPRIATE_WORDS = frozenset({
+    'error', 'undefined', 'null', 'exception', 'traceback', 'stack'
+})
+
+# Palabras y frases que delatan texto sin sentido (en minúsculas)
+_NONSENSE_WORDS = frozenset({
+    "muebles", "iqs", "undefined", "null", "error", "exception",
+    "token", "model", "generator", "pipeline"
+})
+_NONSENSE_PHRASES_RE = re.compile('|'.join(map(re.escape, [
+    "oficina de correos", "suite de correo",
+    "enseñanza media", "educación media", "sistema de educación",
+    "clasificado de cita", "actividades que en una sociedad",
+    "12:00 - 27:00",  # Horario imposible
+])))
+
+
+def _join_context(context_docs: Iterable[str], budget: int = _CONTEXT_CHARS) -> str:
+    """
+    Equivale a ' '.join(context_docs)[:budget] sin unir el contexto completo
+
+    Solo se toman los documentos (y de cada uno los caracteres) que caben en
+    el presupuesto del prompt.
+    """
+    parts = []
+    size = 0
+    for doc in context_docs:
+        parts.append(doc[:budget])
+        size += len(doc) + 1  # Más el espacio separador
+        if size > budget:
+            break
+    return ' '.join(parts)[:budget]
+
+
+def _build_prompt(question: str, context: str) -> str:
+    """Crea el prompt estructurado con el contexto del hotel y la pregunta"""
+    return f"""Contexto del hotel: {context[:_CONTEXT_CHARS]}...
 
+Pregunta del cliente: {question}
 
-def generate_response(question: str, context_docs: List[str]) -> str:
-    """Genera una respuesta usando IA"""
-    try:
-        # Si no hay contexto, usar respuesta por defecto
-        if not context_docs:
-            logger.info("No hay contexto disponible, usando fallback")
-            return generate_fallback_response(question)
+Responde de manera amigable y profesional, usando la información del contexto. Si no encuentras la información específica, menciona que puedes contactar al personal del hotel.
 
-        # Usar contexto completo sin resumir para respuestas más detalladas
-        context_summary = ' '.join(context_docs)
+Respuesta:"""
 
-        # Intentar generar respuesta usando IA
-        response = _generate_with_context(question, context_summary)
 
-        # Si la respuesta es muy corta o no válida, usar fallback
-        if not _validate_response(response) or len(response.strip()) < 30:
-            logger.info("Respuesta de IA muy corta o inválida, usando fallback handler")
-            return generate_fallback_response(question)
+def _run_generator(generador, prompt, **kwargs):
+    """
+    Ejecuta el generador con los parámetros de respuesta del bot
 
-        logger.info("✅ Respuesta generada exitosamente con IA")
-        return response
+    torch.inference_mode() desactiva por completo el registro de autograd
+    (más barato que el no_grad() interno del pipeline).
+    """
+    with torch.inference_mode():
+        return generador(
+            prompt,
+            # Presupuesto propio para la respuesta: max_length contaba también
+            # el prompt y dejaba respuestas demasiado cortas que se descartaban
+            max_new_tokens=120,
+            min_new_tokens=40,
+            temperature=0.7,  # Balance entre creatividad y consistencia
+            do_sample=True,   # Habilitar sampling para respuestas más naturales
+            num_return_sequences=1,
+            # Fijado al cargar el modelo (los modelos dummy no lo tienen)
+            pad_token_id=getattr(generador, 'pad_token_id', None),
+            truncation=True,
+            # Evitar repeticiones sin reescalar todo el vocabulario en cada token
+            no_repeat_ngram_size=3,
+            use_cache=True,  # Decodificación incremental con cache KV
+            **kwargs
+        )
 
-    except Exception as e:
-        logger.error(f"Error al generar respuesta: {e}")
-        logger.info("🔄 Usando fallback handler debido a error")
-        return generate_fallback_response(question)
+
+def _run_generator_batch(generador, prompts: List[str]) -> list:
+    """Genera un lote de prompts; devuelve un resultado por prompt, en orden"""
+    if len(prompts) == 1:
+        return [_run_generator(generador, prompts[0])]
+
+    # El pipeline procesa la lista como un único lote con padding
+    results = _run_generator(generador, prompts, batch_size=len(prompts))
+    if isinstance(results, list) and len(results) == len(prompts) \
+            and all(isinstance(result, list) for result in results):
+        return results
+
+    # Generadores sin soporte de lotes (modelos dummy): uno por uno
+    return [_run_generator(generador, prompt) for prompt in prompts]
+
+
+def _run_generator_items(items: List[Tuple[Any, str]]) -> list:
+    """
+    Genera un lote de pares (generador, prompt), un resultado por par en orden
+
+    Cada prompt se ejecuta con el generador que tenía su petición al encolarse
+    (la carga perezosa puede haber descargado o recargado el modelo entre
+    medias); normalmente todo el lote comparte el mismo.
+    """
+    results: list = [None] * len(items)
+    groups: Dict[int, Tuple[Any, List[int]]] = {}
+    for position, (generador, _) in enumerate(items):
+        groups.setdefault(id(generador), (generador, []))[1].append(position)
+
+    for generador, positions in groups.values():
+        batch_results = _run_generator_batch(
+            generador, [items[position][1] for position in positions])
+        for position, result in zip(positions, batch_results):
+            results[position] = result
+    return results
+
+
+# Agrupa las peticiones async concurrentes en lotes para el generador
+_generator_batcher = GeneratorBatcher(_run_generator_items)
 
 
 async def generate_response_async(question: str, context_docs: List[str]) -> str:
     """Genera una respuesta usando IA (versión asíncrona)"""
     try:
+        # Preguntas con respuesta determinista: sin generación
+        template_response = get_template_response(question)
+        if template_response is not None:
+            return template_response
+
         # Si no hay contexto, usar respuesta por defecto
         if not context_docs:
             logger.info("No hay contexto disponible, usando fallback (async)")
             return generate_fallback_response(question)
 
-        # Usar contexto completo sin resumir para respuestas más detalladas
-        context_summary = ' '.join(context_docs)
+        # Solo la parte del contexto que entra en el prompt
+        context_summary = _join_context(context_docs)
 
         # Intentar generar respuesta usando IA
         response = await _generate_with_context_async(question, context_summary)
@@ -65,77 +169,6 @@ async def generate_response_async(question: str, context_docs: List[str]) -> str
         return generate_fallback_response(question)
 
 
-def _generate_with_context(question: str, context: str) -> str:
-    """Genera respuesta usando contexto con IA como principal y fallback como respaldo"""
-    try:
-        logger.info("🤖 Intentando generar respuesta con IA...")
-        
-        # Verificar si lazy loading está habilitado
-        if ai_models.use_lazy_loading:
-            logger.warning("⚠️ Lazy loading habilitado - usa generate_response_async() en su lugar")
-            return generate_fallback_response(question)
-        
-        # Obtener el modelo generador (solo para modo síncrono)
-        generador = ai_models.get_generador_sync()
-        
-        if generador is None:
-            logger.warning("⚠️ Modelo generador no disponible, usando fallback")
-            return generate_fallback_response(question)
-        
-        # Crear prompt más estructurado y contextual
-        prompt = f"""Contexto del hotel: {context[:300]}...
-
-Pregunta del cliente: {question}
-
-Responde de manera amigable y profesional, usando la información del contexto. Si no encuentras la información específica, menciona que puedes contactar al personal del hotel.
-
-Respuesta:"""
-        
-        logger.info(f"📝 Generando respuesta para: '{question[:50]}...'")
-        
-        # Generar respuesta con parámetros optimizados
-        response = generador(
-            prompt,
-            max_length=300,  # Aumentado para respuestas más completas
-            temperature=0.7,  # Balance entre creatividad y consistencia
-            do_sample=True,   # Habilitar sampling para respuestas más naturales
-            num_return_sequences=1,
-            pad_token_id=generador.tokenizer.eos_token_id if hasattr(generador, 'tokenizer') else None,
-            truncation=True,
-            repetition_penalty=1.2  # Evitar repeticiones
-        )
-        
-        # Extraer la respuesta generada
-        if isinstance(response, list) and len(response) > 0:
-            generated_text = response[0].get('generated_text', '')
-        else:
-            generated_text = str(response)
-        
-        # Limpiar la respuesta (remover el prompt)
-        if prompt in generated_text:
-            answer = generated_text[len(prompt):].strip()
-        else:
-            answer = generated_text.strip()
-        
-        # Limpiar y validar la respuesta
-        answer = _clean_response(answer)
-        
-        logger.info(f"🧠 Respuesta generada: '{answer[:100]}...'")
-        
-        # Validar respuesta antes de devolverla
-        if _validate_response(answer) and not _contains_nonsense(answer):
-            logger.info("✅ Respuesta de IA válida")
-            return answer
-        else:
-            logger.warning("❌ Respuesta de IA inválida o contiene nonsense, usando fallback")
-            return generate_fallback_response(question)
-
-    except Exception as e:
-        logger.error(f"❌ Error al generar con contexto: {e}")
-        logger.info("🔄 Usando fallback handler debido a error en generación")
-        return generate_fallback_response(question)
-
-
 async def _generate_with_context_async(question: str, context: str) -> str:
     """Genera respuesta usando contexto (versión asíncrona)"""
     try:
@@ -149,27 +182,12 @@ async def _generate_with_context_async(question: str, context: str) -> str:
             return generate_fallback_response(question)
         
         # Crear prompt más estructurado y contextual
-        prompt = f"""Contexto del hotel: {context[:300]}...
-
-Pregunta del cliente: {question}
-
-Responde de manera amigable y profesional, usando la información del contexto. Si no encuentras la información específica, menciona que puedes contactar al personal del hotel.
-
-Respuesta:"""
+        prompt = _build_prompt(question, context)
         
         logger.info(f"📝 Generando respuesta para: '{question[:50]}...' (async)")
         
-        # Generar respuesta con parámetros optimizados
-        response = generador(
-            prompt,
-            max_length=300,
-            temperature=0.7,
-            do_sample=True,
-            num_return_sequences=1,
-            pad_token_id=generador.tokenizer.eos_token_id if hasattr(generador, 'tokenizer') else None,
-            truncation=True,
-            repetition_penalty=1.2
-        )
+        # Generar respuesta en lote con las demás peticiones concurrentes
+        response = await _generator_batcher.submit((generador, prompt))
         
         # Extraer la respuesta generada
         if isinstance(response, list) and len(response) > 0:
@@ -202,6 +220,91 @@ Respuesta:"""
         return generate_fallback_response(question)
 
 
+def _generate_streaming(generador, prompt: str, streamer) -> None:
+    """Genera escribiendo los tokens en el streamer (ejecutado en hilo separado)"""
+    try:
+        _run_generator(generador, prompt, streamer=streamer)
+    finally:
+        # Si la generación falla, cerrar el streamer para no bloquear al lector
+        streamer.end()
+
+
+async def stream_response_async(
+        question: str, context_docs: List[str],
+        partial_interval: float = 1.0) -> AsyncIterator[Tuple[str, bool]]:
+    """
+    Genera una respuesta usando IA entregando el texto a medida que se decodifica
+
+    Produce pares (texto, es_final). Los parciales son el texto acumulado hasta
+    ese momento, como mucho uno cada `partial_interval` segundos y solo cuando
+    ya pasa la misma limpieza y los mismos filtros que la respuesta final. El
+    último par es la respuesta definitiva, con la misma validación y el mismo
+    fallback que generate_response_async().
+    """
+    try:
+        if not context_docs:
+            logger.info("No hay contexto disponible, usando fallback (stream)")
+            yield generate_fallback_response(question), True
+            return
+
+        generador = await ai_models.get_generador()
+        tokenizer = getattr(generador, 'tokenizer', None)
+        if tokenizer is None:
+            # Modelos sin tokenizer (dummy): respuesta completa de una vez
+            yield await generate_response_async(question, context_docs), True
+            return
+
+        prompt = _build_prompt(question, _join_context(context_docs))
+        streamer = TextIteratorStreamer(
+            tokenizer, skip_prompt=True, skip_special_tokens=True)
+
+        loop = asyncio.get_running_loop()
+        generation = loop.run_in_executor(
+            inference_pool, _generate_streaming, generador, prompt, streamer)
+
+        # Leer el streamer (bloqueante) fuera del event loop; los fragmentos se
+        # acumulan en una lista y solo se unen cuando toca mostrar un parcial
+        read_next = partial(next, streamer, None)
+        chunks: List[str] = []
+        last_partial = time.monotonic()
+        while True:
+            chunk = await loop.run_in_executor(None, read_next)
+            if chunk is None:
+                break
+            if not chunk:
+                continue
+            chunks.append(chunk)
+            now = time.monotonic()
+            if now - last_partial < partial_interval:
+                continue
+            last_partial = now
+            # Nunca se muestra texto que la respuesta final rechazaría
+            partial_answer = _clean_response(''.join(chunks).strip())
+            if _is_acceptable_answer(partial_answer):
+                yield partial_answer, False
+
+        await generation
+
+        answer = _clean_response(''.join(chunks).strip())
+        if _is_acceptable_answer(answer):
+            logger.info("✅ Respuesta generada exitosamente con IA (stream)")
+            yield answer, True
+        else:
+            logger.info("Respuesta de IA muy corta o inválida, usando fallback handler (stream)")
+            yield generate_fallback_response(question), True
+
+    except Exception as e:
+        logger.error(f"Error al generar respuesta en stream: {e}")
+        logger.info("🔄 Usando fallback handler debido a error (stream)")
+        yield generate_fallback_response(question), True
+
+
+def _is_acceptable_answer(answer: str) -> bool:
+    """Indica si un texto ya limpio puede mostrarse como respuesta de la IA"""
+    return _validate_response(answer) and not _contains_nonsense(answer) \
+        and len(answer) >= 30
+
+
 def _clean_response(response: str) -> str:
     """Limpia la respuesta generada"""
     if not response:
@@ -232,14 +335,12 @@ def _validate_response(response: str) -> bool:
         return False
 
     # Verificar contenido inapropiado o errores
-    inappropriate_words = ['error', 'undefined', 'null', 'exception', 'traceback', 'stack']
     response_lower = response.lower()
-    for word in inappropriate_words:
-        if word in response_lower:
-            return False
+    if not _INAPPROPRIATE_WORDS.isdisjoint(_WORD_RE.findall(response_lower)):
+        return False
 
     # Verificar que no sea solo el prompt repetido
-    if response.lower().startswith('contexto del hotel:') or response.lower().startswith('pregunta del cliente:'):
+    if response_lower.startswith(('contexto del hotel:', 'pregunta del cliente:')):
         return False
 
     return True
@@ -247,31 +348,21 @@ def _validate_response(response: str) -> bool:
 
 def _contains_nonsense(response: str) -> bool:
     """Detecta si la respuesta contiene texto sin sentido"""
-    nonsense_patterns = [
-        "muebles", "oficina de correos", "suite de correo",
-        "enseñanza media", "educación media", "sistema de educación",
-        "clasificado de cita", "IQS", "actividades que en una sociedad",
-        "12:00 - 27:00",  # Horario imposible
-        "undefined", "null", "error", "exception",
-        "token", "model", "generator", "pipeline"
-    ]
-
     response_lower = response.lower()
-    for pattern in nonsense_patterns:
-        if pattern.lower() in response_lower:
-            return True
+    if not _NONSENSE_WORDS.isdisjoint(_WORD_RE.findall(response_lower)) \
+            or _NONSENSE_PHRASES_RE.search(response_lower):
+        return True
 
     # Detectar repeticiones excesivas
     words = response.split()
     if len(words) > 10:
-        word_count = {}
-        for word in words:
-            word_count[word] = word_count.get(word, 0) + 1
-            if word_count[word] > 5:  # Misma palabra más de 5 veces
-                return True
+        # Misma palabra más de 5 veces
+        if Counter(words).most_common(1)[0][1] > 5:
+            return True
 
     # Detectar respuestas que son solo el prompt
-    if response.lower().count('contexto del hotel:') > 0 and response.lower().count('pregunta del cliente:') > 0:
+    # (`in` se detiene en la primera aparición; count() recorría todo el texto)
+    if 'contexto del hotel:' in response_lower and 'pregunta del cliente:' in response_lower:
         return True
 
     return False
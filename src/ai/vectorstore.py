@@ -1,36 +1,119 @@
 """
 Gestión de vectorstore y documentos
 """
+import asyncio
+import copy
+import hashlib
+import importlib.util
+import json
+import math
 import os
-from typing import List
-
+import pickle
+import shutil
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ai.models import GeneratorBatcher, ai_models
+from ai.resource_manager import inference_pool
 from config.settings import settings
 
 # Importar adaptador de base de datos - REQUERIDO
 from database.adapter import db_vectorstore_adapter
 from utils.logger import logger
 
-# Importaciones de langchain - condicionales para evitar errores
-try:
-    from langchain_community.document_loaders import (
-        Docx2txtLoader,
-        PyPDFLoader,
-        TextLoader,
-    )
-    from langchain_community.vectorstores import FAISS
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
+# Dependencias de langchain - solo se comprueba que estén instaladas; cada
+# módulo se importa dentro del método que lo usa, la primera vez que se
+# necesita (los loaders de PDF o FAISS no se cargan si nunca se usan)
+_LANGCHAIN_MODULES = ('langchain_community', 'langchain_text_splitters', 'faiss')
+_MISSING_MODULES = [name for name in _LANGCHAIN_MODULES
+                    if importlib.util.find_spec(name) is None]
+if not _MISSING_MODULES:
     LANGCHAIN_AVAILABLE = True
-    logger.info("✅ Dependencias de LangChain cargadas correctamente")
-except ImportError as e:
-    logger.warning(f"⚠️ Dependencias de LangChain no disponibles: {e}")
+    logger.info("✅ Dependencias de LangChain disponibles")
+else:
+    logger.warning(f"⚠️ Dependencias de LangChain no disponibles: {', '.join(_MISSING_MODULES)}")
     logger.info("💡 Instala: pip install langchain langchain-community faiss-cpu")
     LANGCHAIN_AVAILABLE = False
 
-from ai.models import ai_models
+# Divisor de texto en Rust (opcional): mucho más rápido que el recursivo de Python
+SEMANTIC_SPLITTER_AVAILABLE = importlib.util.find_spec('semantic_text_splitter') is not None
 
 DATABASE_AVAILABLE = True
 logger.info("🗄️ Sistema configurado para usar base de datos SQLite")
 
+# A partir de este número de chunks se usa un índice IVF (búsqueda sublineal)
+# en lugar del índice plano; por debajo, el recorrido completo ya es inmediato
+# y el IVF no tendría vectores suficientes para entrenar sus centroides.
+ANN_MIN_CHUNKS = 10000
+# Listas invertidas que se revisan en cada búsqueda (precisión vs velocidad)
+ANN_NPROBE = 8
+# Chunks por llamada a embed_documents al construir el índice
+EMBED_BATCH_SIZE = 64
+# Preguntas distintas cuyo resultado de búsqueda se conserva en memoria
+SEARCH_CACHE_SIZE = 512
+# Búsquedas concurrentes que se resuelven con un solo embedding por lotes
+SEARCH_BATCH_SIZE = 32
+SEARCH_BATCH_WAIT_MS = 2
+# Archivos del índice guardado: vectores FAISS, docstore de langchain (solo si
+# el índice ya no sigue el orden de los chunks) e ids de los chunks por archivo
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+SOURCES_FILE = "sources.pkl"
+# Chunks ya divididos de cada contenido (hash del texto -> textos de sus chunks)
+CHUNK_CACHE_FILE = "chunks.pkl"
+# Formatos que _load_document sabe leer
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt', '.docx', '.doc')
+
+
+# Recursos CUDA de FAISS, compartidos por los índices copiados a la GPU
+_gpu_resources = None
+
+
+def _index_to_gpu(index):
+    """Copia el índice a la GPU si FAISS tiene soporte CUDA (si no, lo retorna igual)"""
+    global _gpu_resources
+    import faiss
+
+    if not hasattr(faiss, 'StandardGpuResources') or faiss.get_num_gpus() == 0:
+        return index
+    if _gpu_resources is None:
+        _gpu_resources = faiss.StandardGpuResources()
+    logger.info("🚀 Índice FAISS copiado a la GPU")
+    return faiss.index_cpu_to_gpu(_gpu_resources, 0, index)
+
+
+def _index_to_cpu(index):
+    """Copia de CPU del índice (los índices de GPU no se pueden serializar)"""
+    import faiss
+
+    gpu_index_class = getattr(faiss, 'GpuIndex', None)
+    if gpu_index_class is not None and isinstance(index, gpu_index_class):
+        return faiss.index_gpu_to_cpu(index)
+    return index
+
+
+class _RustTextSplitter:
+    """
+    Divisor de semantic-text-splitter con la interfaz de los de langchain
+
+    Ofrece split_text() y split_documents() como RecursiveCharacterTextSplitter
+    (cada chunk con una copia de los metadatos de su documento).
+    """
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        from semantic_text_splitter import TextSplitter
+        self._splitter = TextSplitter(chunk_size, overlap=chunk_overlap)
+
+    def split_text(self, text: str) -> List[str]:
+        return self._splitter.chunks(text)
+
+    def split_documents(self, documents: Iterable) -> List:
+        return [type(doc)(page_content=chunk, metadata=copy.deepcopy(doc.metadata))
+                for doc in documents
+                for chunk in self.split_text(doc.page_content)]
+
 
 class VectorStoreManager:
     """Gestión del vectorstore y documentos"""
@@ -39,34 +122,77 @@ class VectorStoreManager:
         self.vectorstore = None
         self._documents_processed = False
         self._chunks = []
+        # Archivo -> ids de sus chunks en el vectorstore (altas y bajas incrementales)
+        self._chunk_ids_by_source: Dict[str, List[str]] = {}
+        # True mientras el vector i del índice sea el chunk i de self._chunks
+        self._index_matches_chunks = False
+        self._index_path = None
+        # Modelo de embeddings obtenido una vez (también es el embedding_function del índice)
+        self._embedding_model = None
+        # LRU (pregunta, k) -> textos encontrados; se limpia al cambiar el índice
+        self._search_cache: "OrderedDict[Tuple[str, int], Tuple[str, ...]]" = OrderedDict()
+        self._search_cache_lock = Lock()
+        # Aumenta en cada limpieza: una búsqueda que empezó antes no guarda su
+        # resultado (calculado con el índice anterior)
+        self._search_generation = 0
+        # asyncio.Lock de la creación perezosa del índice: las primeras
+        # preguntas concurrentes esperan a una sola construcción (se crea al
+        # primer uso, dentro del event loop)
+        self._build_lock: Optional[asyncio.Lock] = None
+        # Las búsquedas async concurrentes se agrupan en un solo embedding + search
+        self._search_batcher = GeneratorBatcher(
+            self._search_batch, max_batch=SEARCH_BATCH_SIZE,
+            max_wait_ms=SEARCH_BATCH_WAIT_MS)
         # Sistema configurado para usar SIEMPRE base de datos SQLite
         self.use_database = True
+        # El text_splitter se crea al preparar los documentos por primera vez
+        self._text_splitter = None
 
-        # Inicializar text_splitter solo si langchain está disponible
         if LANGCHAIN_AVAILABLE:
-            self.text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=settings.CHUNK_SIZE,
-                chunk_overlap=settings.CHUNK_OVERLAP
-            )
             logger.info("🗄️ VectorStore inicializado - MODO BASE DE DATOS")
             logger.info("🔄 VectorStore configurado en modo lazy loading")
         else:
-            self.text_splitter = None
             logger.warning(
                 "⚠️ VectorStore inicializado SIN dependencias de LangChain")
             logger.info(
                 "💡 Funcionalidad limitada - instala las dependencias para funcionalidad completa")
 
+    @property
+    def text_splitter(self):
+        """
+        Divisor de texto (solo si langchain está disponible), creado al primer uso
+
+        Usa semantic-text-splitter (Rust) si está instalado y el
+        RecursiveCharacterTextSplitter de langchain en caso contrario.
+        """
+        if self._text_splitter is None and LANGCHAIN_AVAILABLE:
+            if SEMANTIC_SPLITTER_AVAILABLE:
+                self._text_splitter = _RustTextSplitter(
+                    settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)
+            else:
+                from langchain_text_splitters import RecursiveCharacterTextSplitter
+                self._text_splitter = RecursiveCharacterTextSplitter(
+                    chunk_size=settings.CHUNK_SIZE,
+                    chunk_overlap=settings.CHUNK_OVERLAP
+                )
+            logger.info(
+                f"✂️ Chunks de {settings.CHUNK_SIZE} caracteres, superposición {settings.CHUNK_OVERLAP}")
+        return self._text_splitter
+
     def _load_document(self, file_path: str) -> List:
         """Carga un documento según su extensión"""
         extension = os.path.splitext(file_path)[1].lower()
 
         try:
+            # Solo se importa el loader del formato que se va a leer
             if extension == '.pdf':
+                from langchain_community.document_loaders import PyPDFLoader
                 loader = PyPDFLoader(file_path)
             elif extension == '.txt':
+                from langchain_community.document_loaders import TextLoader
                 loader = TextLoader(file_path, encoding='utf-8')
-            elif extension in ['.docx', '.doc']:
+            elif extension in ('.docx', '.doc'):
+                from langchain_community.document_loaders import Docx2txtLoader
                 loader = Docx2txtLoader(file_path)
             else:
                 logger.warning(f"Formato no soportado: {extension}")
@@ -94,14 +220,6 @@ class VectorStoreManager:
         try:
             logger.info(
                 "🗄️ Cargando documentos desde la base de datos SQLite...")
-            documentos_db = db_vectorstore_adapter.get_all_documents_for_vectorstore()
-
-            if not documentos_db:
-                logger.warning(
-                    "⚠️ No se encontraron documentos en la base de datos")
-                logger.info(
-                    "💡 Ejecuta: python migrate_to_database.py --migrate")
-                return
 
             # Convertir a formato Document de langchain
             try:
@@ -114,19 +232,19 @@ class VectorStoreManager:
                         "❌ No se puede importar Document de langchain")
                     return
 
-            all_docs = []
-
-            for doc_data in documentos_db:
-                doc = Document(
-                    page_content=doc_data['page_content'],
-                    metadata=doc_data['metadata']
-                )
-                all_docs.append(doc)
+            # Cada fila se formatea, se convierte y se divide de una en una:
+            # el corpus completo sin dividir nunca está en memoria junto a los chunks
+            documentos_db = db_vectorstore_adapter.iter_documents_for_vectorstore()
+            self._chunks = self._split_with_cache(
+                Document(**doc_data) for doc_data in documentos_db)
 
-            logger.info(f"📄 Documentos de BD obtenidos: {len(all_docs)}")
+            if not self._chunks:
+                logger.warning(
+                    "⚠️ No se encontraron documentos en la base de datos")
+                logger.info(
+                    "💡 Ejecuta: python migrate_to_database.py --migrate")
+                return
 
-            # Dividir documentos en chunks
-            self._chunks = self.text_splitter.split_documents(all_docs)
             logger.info(
                 f"📄 Documentos de BD divididos en {len(self._chunks)} chunks")
             self._documents_processed = True
@@ -139,24 +257,72 @@ class VectorStoreManager:
             raise RuntimeError(
                 "Base de datos requerida pero no disponible. Ejecuta la migración primero.")
 
+    def _split_with_cache(self, docs: Iterable) -> List:
+        """
+        Divide los documentos en chunks reutilizando las divisiones anteriores
+
+        Cada contenido se identifica por un hash de su texto y de la
+        configuración de división; solo los contenidos nuevos o modificados
+        pasan por el text_splitter. El resultado es idéntico al de
+        split_documents (cada chunk con una copia de los metadatos).
+        """
+        cache_file = settings.VECTORSTORE_CACHE_DIR / CHUNK_CACHE_FILE
+        try:
+            with open(cache_file, 'rb') as f:
+                cached = pickle.load(f)
+        except Exception:
+            cached = {}
+
+        split_config = (f"{type(self.text_splitter).__name__}"
+                        f"|{settings.CHUNK_SIZE}|{settings.CHUNK_OVERLAP}|")
+        current = {}
+        chunks = []
+        for doc in docs:
+            key = hashlib.blake2b((split_config + doc.page_content).encode(),
+                                  digest_size=16).hexdigest()
+            texts = cached.get(key)
+            if texts is None:
+                texts = tuple(self.text_splitter.split_text(doc.page_content))
+            current[key] = texts
+
+            doc_class = type(doc)
+            chunks.extend(
+                doc_class(page_content=text, metadata=copy.deepcopy(doc.metadata))
+                for text in texts)
+
+        # Solo se reescribe si cambió algún contenido (y así no crece sin límite)
+        if current.keys() != cached.keys():
+            try:
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                with open(cache_file, 'wb') as f:
+                    pickle.dump(current, f, protocol=pickle.HIGHEST_PROTOCOL)
+            except OSError as e:
+                logger.warning(f"⚠️ No se pudo guardar la caché de chunks: {e}")
+
+        return chunks
+
     def _prepare_documents_from_files(self):
         """Prepara documentos desde archivos (método original)"""
         all_docs = []
 
-        if not settings.DOCUMENTOS_DIR.exists():
+        # Procesar los archivos soportados de la carpeta documentos
+        # (os.scandir reutiliza el tipo de archivo leído del directorio; la
+        # carpeta inexistente se detecta al abrirla, sin un exists() previo;
+        # los formatos no soportados se descartan por nombre, sin abrirlos)
+        try:
+            with os.scandir(settings.DOCUMENTOS_DIR) as entries:
+                for entry in entries:
+                    if entry.name.lower().endswith(SUPPORTED_EXTENSIONS) \
+                            and entry.is_file():
+                        documents = self._load_document(entry.path)
+                        if documents:
+                            all_docs.extend(documents)
+        except FileNotFoundError:
             logger.warning(
                 f"La carpeta {settings.DOCUMENTOS_DIR} no existe. Creándola...")
             settings.DOCUMENTOS_DIR.mkdir(parents=True, exist_ok=True)
             return
 
-        # Procesar todos los archivos en la carpeta documentos
-        for file_name in os.listdir(settings.DOCUMENTOS_DIR):
-            file_path = settings.DOCUMENTOS_DIR / file_name
-            if file_path.is_file():
-                documents = self._load_document(str(file_path))
-                if documents:
-                    all_docs.extend(documents)
-
         if all_docs:
             # Dividir documentos en chunks (esto no requiere modelos pesados)
             self._chunks = self.text_splitter.split_documents(all_docs)
@@ -165,6 +331,201 @@ class VectorStoreManager:
         else:
             logger.warning("⚠️ No se encontraron documentos para procesar")
 
+    def _index_dir(self) -> Path:
+        """
+        Directorio del índice FAISS para los chunks actuales
+
+        La clave combina el modelo de embeddings, la configuración de división
+        y el contenido de cada chunk: cualquier cambio produce otro directorio.
+        """
+        digest = hashlib.sha1(
+            f"{settings.MODELO_EMBEDDINGS}|{settings.CHUNK_SIZE}|{settings.CHUNK_OVERLAP}"
+            f"|{settings.VECTOR_QUANTIZATION}|ip".encode())
+        for chunk in self._chunks:
+            digest.update(chunk.page_content.encode())
+            digest.update(json.dumps(chunk.metadata, sort_keys=True, default=str).encode())
+            digest.update(b'\0')
+        return settings.VECTORSTORE_CACHE_DIR / f"faiss_{digest.hexdigest()[:12]}"
+
+    def _build_vectorstore(self, embedding_model):
+        """
+        Carga el índice FAISS desde disco o lo crea y lo persiste
+
+        Solo se calculan los embeddings de todos los chunks cuando el
+        contenido cambió; en un arranque normal el índice se lee de disco.
+        """
+        index_dir = self._index_dir()
+        self._index_path = index_dir
+        self._clear_search_cache()
+
+        if (index_dir / INDEX_FILE).exists():
+            try:
+                if (index_dir / DOCSTORE_FILE).exists():
+                    # Índice modificado de forma incremental: docstore completo
+                    from langchain_community.vectorstores import FAISS
+                    self.vectorstore = FAISS.load_local(
+                        str(index_dir), embedding_model,
+                        allow_dangerous_deserialization=True,  # Archivos generados por el propio bot
+                        normalize_L2=True)
+                    self.vectorstore.index = _index_to_gpu(self.vectorstore.index)
+                else:
+                    # Solo chunks de la BD: ya están en memoria, basta con los vectores
+                    import faiss
+                    index = faiss.read_index(str(index_dir / INDEX_FILE))
+                    if index.ntotal != len(self._chunks):
+                        raise ValueError("el índice no corresponde a los chunks actuales")
+                    self.vectorstore = self._wrap_index(embedding_model, index, self._chunks)
+                self._index_matches_chunks = not (index_dir / DOCSTORE_FILE).exists()
+
+                self._chunk_ids_by_source = {}
+                sources_file = index_dir / SOURCES_FILE
+                if sources_file.exists():
+                    with open(sources_file, 'rb') as f:
+                        self._chunk_ids_by_source = pickle.load(f)
+                logger.info(f"✅ Vectorstore cargado desde disco: {index_dir.name}")
+                return
+            except Exception as e:
+                logger.warning(f"⚠️ No se pudo cargar el índice guardado, recreándolo: {e}")
+
+        embeddings = self._embed_in_batches(
+            embedding_model, [chunk.page_content for chunk in self._chunks])
+        self.vectorstore = self._build_index(embedding_model, self._chunks, embeddings)
+        self._chunk_ids_by_source = {}
+        self._index_matches_chunks = True
+
+        if self._save_vectorstore():
+            self._remove_stale_indexes(index_dir)
+
+    def _save_vectorstore(self) -> bool:
+        """
+        Guarda el índice actual y los ids de chunks por archivo en disco
+
+        Si el índice contiene exactamente los chunks de la base de datos, en
+        orden, se guardan únicamente los vectores: los textos se reconstruyen
+        con los chunks (que ya se preparan para calcular la clave del índice),
+        sin escribir ni volver a leer el docstore serializado de langchain.
+        """
+        if self.vectorstore is None or self._index_path is None:
+            return False
+
+        index = self.vectorstore.index
+        try:
+            if not self._index_matches_chunks:
+                # save_local escribe self.index: se guarda su copia de CPU
+                self.vectorstore.index = _index_to_cpu(index)
+                self.vectorstore.save_local(str(self._index_path))
+            else:
+                import faiss
+                self._index_path.mkdir(parents=True, exist_ok=True)
+                faiss.write_index(_index_to_cpu(index), str(self._index_path / INDEX_FILE))
+                docstore_file = self._index_path / DOCSTORE_FILE
+                if docstore_file.exists():
+                    docstore_file.unlink()
+            with open(self._index_path / SOURCES_FILE, 'wb') as f:
+                pickle.dump(self._chunk_ids_by_source, f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            logger.info(f"💾 Vectorstore guardado en disco: {self._index_path.name}")
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo guardar el vectorstore en disco: {e}")
+            return False
+        finally:
+            self.vectorstore.index = index
+
+    @staticmethod
+    def _embed_in_batches(embedding_model, texts: List[str],
+                          batch_size: int = EMBED_BATCH_SIZE):
+        """
+        Calcula los embeddings de los textos en lotes de tamaño fijo
+
+        Cada lote es una sola multiplicación de matrices en el modelo; el
+        resultado es una matriz float32 (un vector por fila).
+        """
+        import numpy as np
+
+        batches = [
+            np.asarray(embedding_model.embed_documents(texts[i:i + batch_size]),
+                       dtype='float32')
+            for i in range(0, len(texts), batch_size)
+        ]
+        return np.concatenate(batches)
+
+    @staticmethod
+    def _build_index(embedding_model, chunks: List, embeddings):
+        """
+        Construye el índice FAISS sobre los embeddings de los chunks
+
+        Los vectores se normalizan una sola vez y se comparan por producto
+        interno (similitud coseno), sin la resta y el cuadrado de L2; el
+        wrapper normaliza también cada pregunta (normalize_L2).
+
+        Desde ANN_MIN_CHUNKS se usa un índice IVF: las búsquedas solo recorren
+        las ANN_NPROBE listas más cercanas a la pregunta (~O(√N·d)). Con
+        VECTOR_QUANTIZATION sus vectores se guardan en int8 (1/4 de memoria).
+        """
+        import faiss
+
+        faiss.normalize_L2(embeddings)
+        dimension = embeddings.shape[1]
+
+        if len(embeddings) >= ANN_MIN_CHUNKS:
+            nlist = int(4 * math.sqrt(len(embeddings)))
+            quantizer = faiss.IndexFlatIP(dimension)
+            if settings.VECTOR_QUANTIZATION:
+                index = faiss.IndexIVFScalarQuantizer(
+                    quantizer, dimension, nlist,
+                    faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexIVFFlat(
+                    quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(embeddings)
+            index.nprobe = ANN_NPROBE
+            logger.info(f"🧭 Índice IVF creado: {len(embeddings)} vectores, {nlist} listas")
+        else:
+            index = faiss.IndexFlatIP(dimension)
+        index.add(embeddings)
+
+        return VectorStoreManager._wrap_index(embedding_model, index, chunks)
+
+    @staticmethod
+    def _wrap_index(embedding_model, index, chunks: List):
+        """
+        Envuelve un índice FAISS con el vectorstore de langchain (ids = posición)
+
+        Con CUDA disponible el índice se copia a la GPU; las búsquedas
+        (similarity_search y _search_batch) usan esa copia.
+        """
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        from langchain_community.vectorstores import FAISS
+
+        return FAISS(
+            embedding_function=embedding_model,
+            index=_index_to_gpu(index),
+            docstore=InMemoryDocstore(
+                {str(i): chunk for i, chunk in enumerate(chunks)}),
+            index_to_docstore_id={i: str(i) for i in range(len(chunks))},
+            normalize_L2=True,
+        )
+
+    @staticmethod
+    def _remove_stale_indexes(current_dir: Path):
+        """Elimina los índices guardados de contenidos anteriores"""
+        for index_dir in current_dir.parent.glob("faiss_*"):
+            if index_dir != current_dir:
+                shutil.rmtree(index_dir, ignore_errors=True)
+
+    def _get_embedding_model_sync(self):
+        """Modelo de embeddings, pedido a ai_models solo la primera vez"""
+        if self._embedding_model is None:
+            self._embedding_model = ai_models.get_embedding_model_sync()
+        return self._embedding_model
+
+    async def _get_embedding_model(self):
+        """Modelo de embeddings (async), pedido a ai_models solo la primera vez"""
+        if self._embedding_model is None:
+            self._embedding_model = await ai_models.get_embedding_model()
+        return self._embedding_model
+
     def _create_vectorstore(self):
         """Crea el vectorstore SOLO cuando sea necesario (modo síncrono - solo para carga inmediata)"""
         if self.vectorstore is not None:
@@ -185,10 +546,9 @@ class VectorStoreManager:
         # Aquí es donde se cargan los modelos pesados (solo modo inmediato)
         logger.info("⏳ Cargando modelo de embeddings (puede tardar un momento)...")
         try:
-            embedding_model = ai_models.get_embedding_model_sync()
+            embedding_model = self._get_embedding_model_sync()
             if embedding_model:
-                self.vectorstore = FAISS.from_documents(
-                    self._chunks, embedding_model)
+                self._build_vectorstore(embedding_model)
                 logger.info("✅ Vectorstore creado exitosamente")
             else:
                 logger.warning("⚠️ Modelo de embeddings no disponible")
@@ -213,19 +573,98 @@ class VectorStoreManager:
             return []
 
         try:
-            docs = self.vectorstore.similarity_search(question, k=k)
+            docs = self._search_cached(question, k)
             logger.info(
                 f"✅ Encontrados {len(docs)} documentos relevantes desde BD")
-            return [doc.page_content for doc in docs]
+            return list(docs)
         except Exception as e:
             logger.error(f"❌ Error en búsqueda de contexto: {e}")
             return []
 
+    def _get_cached_search(self, question: str, k: int) -> Optional[Tuple[str, ...]]:
+        """Resultado ya calculado de una búsqueda (o None)"""
+        with self._search_cache_lock:
+            docs = self._search_cache.get((question, k))
+            if docs is not None:
+                self._search_cache.move_to_end((question, k))
+            return docs
+
+    def _store_search(self, question: str, k: int, docs: Tuple[str, ...], generation: int):
+        """Guarda el resultado de una búsqueda en el LRU si el índice no cambió"""
+        with self._search_cache_lock:
+            if generation != self._search_generation:
+                return
+            self._search_cache[(question, k)] = docs
+            if len(self._search_cache) > SEARCH_CACHE_SIZE:
+                self._search_cache.popitem(last=False)
+
+    def _clear_search_cache(self):
+        """Descarta las búsquedas memorizadas (el índice cambió)"""
+        with self._search_cache_lock:
+            self._search_cache.clear()
+            self._search_generation += 1
+
+    def _search_cached(self, question: str, k: int) -> Tuple[str, ...]:
+        """
+        Búsqueda en el vectorstore memoizada por pregunta
+
+        Las preguntas repetidas no vuelven a calcular el embedding ni a
+        recorrer el índice. Se limpia cada vez que el índice cambia.
+        """
+        docs = self._get_cached_search(question, k)
+        if docs is None:
+            generation = self._search_generation
+            found = self.vectorstore.similarity_search(question, k=k)
+            docs = tuple(doc.page_content for doc in found)
+            self._store_search(question, k, docs, generation)
+        return docs
+
+    def _search_batch(self, queries: List[Tuple[str, int]]) -> List[Tuple[str, ...]]:
+        """
+        Resuelve varias búsquedas con un embedding por lotes y un solo search
+
+        Las preguntas se codifican como consultas (con el LRU de embeddings de
+        consulta; solo las nuevas pasan por el modelo, en un lote) y se hace
+        una sola llamada a index.search (con el mayor k); cada resultado se
+        recorta a su k.
+        """
+        import faiss
+        import numpy as np
+
+        generation = self._search_generation
+        vectorstore = self.vectorstore
+        embedding_function = vectorstore.embedding_function
+        questions = [q for q, _ in queries]
+        embed_queries = getattr(embedding_function, 'embed_queries', None)
+        if embed_queries is not None:
+            vectors = embed_queries(questions)
+        else:
+            vectors = [embedding_function.embed_query(q) for q in questions]
+        embeddings = np.asarray(vectors, dtype='float32')
+        faiss.normalize_L2(embeddings)  # El índice compara por producto interno
+        _, indices = vectorstore.index.search(embeddings, max(k for _, k in queries))
+
+        results = []
+        for (question, k), row in zip(queries, indices):
+            docs = tuple(
+                vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]).page_content
+                for i in row[:k] if i != -1)
+            self._store_search(question, k, docs, generation)
+            results.append(docs)
+        return results
+
     async def search_context_async(self, question: str, k: int = 3) -> List[str]:
         """Busca contexto relevante para una pregunta (método asíncrono para lazy loading)"""
         if not self.vectorstore:
-            # Intentar crear el vectorstore con lazy loading
-            await self._create_vectorstore_async()
+            if self._build_lock is None:
+                self._build_lock = asyncio.Lock()
+
+            # Intentar crear el vectorstore con lazy loading; una sola corrutina
+            # construye el índice y las demás esperan su resultado
+            async with self._build_lock:
+                # Verificar si ya fue creado mientras se esperaba el lock
+                if not self.vectorstore:
+                    await self._create_vectorstore_async()
 
             if not self.vectorstore:
                 logger.warning(
@@ -233,9 +672,13 @@ class VectorStoreManager:
                 return []
 
         try:
-            docs = self.vectorstore.similarity_search(question, k=k)
+            docs = self._get_cached_search(question, k)
+            if docs is None:
+                # Embedding + búsqueda FAISS en lote con las demás preguntas
+                # concurrentes, en el pool de inferencia (fuera del event loop)
+                docs = await self._search_batcher.submit((question, k))
             logger.info(f"✅ Encontrados {len(docs)} documentos relevantes (async)")
-            return [doc.page_content for doc in docs]
+            return list(docs)
         except Exception as e:
             logger.error(f"❌ Error en búsqueda de contexto (async): {e}")
             return []
@@ -245,8 +688,9 @@ class VectorStoreManager:
         if self.vectorstore is not None:
             return  # Ya está creado
 
-        # Preparar documentos si no se ha hecho
-        self._prepare_documents()
+        # Preparar documentos si no se ha hecho (consulta SQLite + división)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(inference_pool, self._prepare_documents)
 
         if not self._chunks:
             logger.warning("⚠️ No hay chunks disponibles para crear vectorstore")
@@ -254,33 +698,92 @@ class VectorStoreManager:
 
         logger.info("⏳ Cargando modelo de embeddings de forma asíncrona...")
         try:
-            embedding_model = await ai_models.get_embedding_model()
+            embedding_model = await self._get_embedding_model()
             if embedding_model:
-                self.vectorstore = FAISS.from_documents(
-                    self._chunks, embedding_model)
+                # Los embeddings de todo el corpus no deben bloquear el event loop
+                await loop.run_in_executor(
+                    inference_pool, self._build_vectorstore, embedding_model)
                 logger.info("✅ Vectorstore creado exitosamente (async)")
             else:
                 logger.warning("⚠️ Modelo de embeddings no disponible")
         except Exception as e:
             logger.error(f"❌ Error al crear vectorstore async: {e}")
 
+    @staticmethod
+    def _chunk_key(chunk) -> str:
+        """Identifica un chunk por su texto y sus metadatos"""
+        return hashlib.blake2b(
+            (chunk.page_content
+             + json.dumps(chunk.metadata, sort_keys=True, default=str)).encode(),
+            digest_size=16).hexdigest()
+
+    def _apply_chunk_changes(self):
+        """
+        Actualiza el índice existente con los chunks actuales de la base de datos
+
+        Compara los chunks indexados (sin los de archivos añadidos) con los
+        recién preparados: solo se eliminan los que desaparecieron y solo se
+        calculan los embeddings de los nuevos o modificados.
+        """
+        file_ids = {doc_id for ids in self._chunk_ids_by_source.values() for doc_id in ids}
+        indexed = {
+            self._chunk_key(doc): doc_id
+            for doc_id, doc in self.vectorstore.docstore._dict.items()
+            if doc_id not in file_ids
+        }
+        current = {}
+        for chunk in self._chunks:
+            current.setdefault(self._chunk_key(chunk), chunk)
+
+        removed_ids = [doc_id for key, doc_id in indexed.items() if key not in current]
+        new_chunks = [chunk for key, chunk in current.items() if key not in indexed]
+
+        if not removed_ids and not new_chunks:
+            logger.info("✅ Conocimiento sin cambios: se mantiene el índice")
+            return
+
+        if removed_ids:
+            self.vectorstore.delete(removed_ids)
+        if new_chunks:
+            self.vectorstore.add_documents(new_chunks)
+        self._index_matches_chunks = False
+
+        # El índice corresponde ahora al nuevo contenido: se guarda con su clave
+        self._index_path = self._index_dir()
+        if self._save_vectorstore():
+            self._remove_stale_indexes(self._index_path)
+        logger.info(
+            f"✅ Índice actualizado: {len(new_chunks)} chunks nuevos, {len(removed_ids)} eliminados")
+
     def update_knowledge(self):
-        """Actualiza el conocimiento del vectorstore (sin cargar modelos pesados)"""
+        """Actualiza el conocimiento del vectorstore (solo se recalculan los chunks que cambiaron)"""
         logger.info("📚 Actualizando conocimiento...")
-        # Solo preparar documentos, no cargar modelos hasta que sea necesario
+        # Volver a leer la base de datos (no carga modelos)
+        self._documents_processed = False
         self._prepare_documents()
-        # Limpiar vectorstore existente para forzar recreación en próxima búsqueda
-        self.vectorstore = None
-        logger.info("✅ Conocimiento actualizado (lazy loading activado)")
+        self._embedding_model = None
+        self._clear_search_cache()
+
+        if self.vectorstore is None:
+            # Se creará en la próxima búsqueda
+            logger.info("✅ Conocimiento actualizado (lazy loading activado)")
+            return
+
+        try:
+            self._apply_chunk_changes()
+        except Exception as e:
+            # Si no se puede actualizar en sitio, recrearlo en la próxima búsqueda
+            logger.warning(f"⚠️ No se pudo actualizar el índice, se recreará: {e}")
+            self.vectorstore = None
 
     def reload_document(self, file_path: str):
         """Recarga un documento específico en el vectorstore"""
         try:
             logger.info(f"🔄 Recargando documento: {file_path}")
 
-            # Para simplicidad, reconstruir todo el vectorstore
-            # En una implementación más avanzada, se podría actualizar solo el documento específico
-            self._create_vectorstore()
+            # Solo se reemplazan los chunks de este documento
+            self.remove_document(file_path)
+            self.add_document(file_path)
 
             logger.info(f"✅ Documento recargado: {file_path}")
 
@@ -300,19 +803,31 @@ class VectorStoreManager:
             # Dividir en chunks
             chunks = self.text_splitter.split_documents(documents)
 
-            if self.vectorstore:
-                # Añadir al vectorstore existente
-                embedding_model = ai_models.get_embedding_model_sync()
-                if embedding_model:
-                    self.vectorstore.add_documents(chunks)
-                    logger.info(
-                        f"✅ Documento añadido: {file_path} ({len(chunks)} chunks)")
-                else:
-                    logger.error("Modelo de embeddings no disponible")
-            else:
-                # Crear nuevo vectorstore si no existe
+            embedding_model = self._get_embedding_model_sync()
+            if not embedding_model:
+                logger.error("Modelo de embeddings no disponible")
+                return
+
+            # Partir del índice de la base de datos (o del guardado en disco)
+            if self.vectorstore is None:
                 self._create_vectorstore()
 
+            # Solo se calculan los embeddings de los chunks nuevos
+            if self.vectorstore is not None:
+                ids = self.vectorstore.add_documents(chunks)
+            else:
+                embeddings = self._embed_in_batches(
+                    embedding_model, [chunk.page_content for chunk in chunks])
+                self.vectorstore = self._build_index(embedding_model, chunks, embeddings)
+                ids = list(self.vectorstore.index_to_docstore_id.values())
+
+            self._chunk_ids_by_source.setdefault(file_path, []).extend(ids)
+            self._index_matches_chunks = False
+            self._clear_search_cache()
+            self._save_vectorstore()
+            logger.info(
+                f"✅ Documento añadido: {file_path} ({len(chunks)} chunks)")
+
         except Exception as e:
             logger.error(f"❌ Error al añadir documento {file_path}: {e}")
 
@@ -321,11 +836,18 @@ class VectorStoreManager:
         try:
             logger.info(f"🗑️ Eliminando documento: {file_path}")
 
-            # Para simplicidad, reconstruir todo el vectorstore sin el documento eliminado
-            # En una implementación más avanzada, se podría eliminar solo el documento específico
-            self._create_vectorstore()
+            ids = self._chunk_ids_by_source.pop(file_path, None)
+            if not ids or self.vectorstore is None:
+                logger.warning(f"El documento no está en el vectorstore: {file_path}")
+                return
+
+            # Solo se eliminan los vectores de este documento
+            self.vectorstore.delete(ids)
+            self._index_matches_chunks = False
+            self._clear_search_cache()
+            self._save_vectorstore()
 
-            logger.info(f"✅ Documento eliminado: {file_path}")
+            logger.info(f"✅ Documento eliminado: {file_path} ({len(ids)} chunks)")
 
         except Exception as e:
             logger.error(f"❌ Error al eliminar documento {file_path}: {e}")
@@ -1,27 +1,181 @@
 """
 Gestión de analytics y métricas del bot
 """
+import atexit
 import json
+import queue
 import sqlite3
+import threading
 import time
-from collections import defaultdict
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any, Dict, List
 
+from config.settings import settings
 from utils.logger import logger
 
+# orjson (opcional): codificación JSON en C, bastante más rápida que json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Sentencias del camino de escritura de cada evento. sqlite3 guarda cada
+# sentencia preparada en una caché por conexión (clave = texto SQL); con la
+# conexión del hilo escritor y el mismo texto, cada lote reutiliza la
+# sentencia ya compilada en lugar de volver a analizar y planificar el SQL.
+_INSERT_EVENT_SQL = '''
+    INSERT INTO {table} (event_type, user_id, timestamp, data, session_id)
+    VALUES (?, ?, ?, ?, ?)
+'''
+# Los eventos se reparten en una tabla por día local (events_YYYYMMDD): la
+# retención elimina tablas enteras y las consultas solo leen los días de su
+# ventana
+_PARTITION_PREFIX = 'events_'
+_LIST_PARTITIONS_SQL = '''
+    SELECT name FROM sqlite_master
+    WHERE type = 'table' AND name GLOB 'events_[0-9]*'
+    ORDER BY name
+'''
+# Fuente sin filas para ventanas en las que aún no hay particiones
+_NO_EVENTS_SQL = '''(
+    SELECT NULL AS event_type, NULL AS user_id, NULL AS timestamp, NULL AS data
+    WHERE 0
+)'''
+# Sentencias distintas que la conexión mantiene preparadas
+_STATEMENT_CACHE_SIZE = 256
+# Máximo de eventos que el hilo escritor agrupa en una transacción
+_WRITER_BATCH_SIZE = 500
+# Segundos que el hilo escritor espera a que se acumulen más eventos
+_WRITER_WAIT = 0.05
+# Marca en la cola que detiene el hilo escritor
+_STOP = object()
+
+
+def _dumps(data: Dict[str, Any]):
+    """Serializa los datos de un evento (bytes con orjson, str con json)"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data)
+
+
+def _loads(raw) -> Any:
+    """Deserializa los datos de un evento guardados como str o bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+# Último día calculado (inicio_us, fin_us, tabla): casi todos los eventos
+# seguidos caen en el mismo día y basta con comparar dos enteros
+_last_partition = (0, 0, '')
+
+
+def _partition_name(timestamp_us: int) -> str:
+    """Tabla de eventos del día local al que pertenece el instante"""
+    global _last_partition
+    start, end, table = _last_partition
+    if start <= timestamp_us < end:
+        return table
+    day_start = datetime.combine(
+        datetime.fromtimestamp(timestamp_us / 1_000_000).date(), datetime.min.time())
+    table = _PARTITION_PREFIX + day_start.strftime('%Y%m%d')
+    _last_partition = (
+        int(day_start.timestamp() * 1_000_000),
+        int((day_start + timedelta(days=1)).timestamp() * 1_000_000),
+        table
+    )
+    return table
+
+
+def _create_partition(conn: sqlite3.Connection, table: str):
+    """Crea la tabla de eventos de un día y sus índices si no existen"""
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            event_type TEXT NOT NULL,
+            user_id INTEGER,
+            timestamp INTEGER NOT NULL,
+            data TEXT,
+            session_id INTEGER
+        )
+    ''')
+    # Índices para las consultas por rango de fechas, usuario y tipo
+    conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_ts ON {table}(timestamp)')
+    conn.execute(
+        f'CREATE INDEX IF NOT EXISTS idx_{table}_user_ts ON {table}(user_id, timestamp DESC)')
+    conn.execute(
+        f'CREATE INDEX IF NOT EXISTS idx_{table}_type_ts ON {table}(event_type, timestamp)')
+
+
+def _activity_from_row(cursor: sqlite3.Cursor, row: tuple) -> Dict[str, Any]:
+    """row_factory de get_user_activity: construye el dict de cada fila"""
+    event_type, timestamp, data = row
+    return {
+        'event_type': event_type,
+        'timestamp': datetime.fromtimestamp(timestamp / 1_000_000).isoformat(),
+        'data': None if data is None else _loads(data)
+    }
+
+
+def _now_us() -> int:
+    """Instante actual en microsegundos Unix (formato de events.timestamp)"""
+    return time.time_ns() // 1000
+
+
+def _cutoff_us(days: int) -> int:
+    """Microsegundos Unix de hace `days` días"""
+    return int((time.time() - days * 86400) * 1_000_000)
+
+
+def _day_start_us(days: int) -> int:
+    """Microsegundos Unix del inicio (hora local) del día de hace `days` días"""
+    start = datetime.combine((datetime.now() - timedelta(days=days)).date(), datetime.min.time())
+    return int(start.timestamp() * 1_000_000)
+
 
 class AnalyticsManager:
     """Gestión de analytics y métricas del bot"""
 
     def __init__(self):
         self.db_path = "src/data/analytics.db"
-        self.events = []
-        self.metrics = defaultdict(int)
         self.session_data = {}
+        # Conexión compartida para consultas y limpieza (caché de páginas
+        # caliente); el lock serializa su uso entre los hilos del bot
+        self._conn = None
+        self._lock = threading.Lock()
+        # Las escrituras van a una cola que consume un hilo escritor con su
+        # propia conexión: track_event solo encola y no espera al disco
+        self._queue = queue.SimpleQueue()
+        self._writer = None
+        # Particiones que el hilo escritor ya ha creado
+        self._writer_partitions = set()
+        # Modo en memoria: la base vive en RAM y se copia al archivo cada
+        # ANALYTICS_SAVE_INTERVAL segundos (un fallo pierde como mucho ese
+        # intervalo de eventos)
+        self._in_memory = settings.ANALYTICS_IN_MEMORY
+        self._snapshotter = None
+        self._snapshot_stop = threading.Event()
         self._init_database()
 
+    def _connect(self) -> sqlite3.Connection:
+        """Abre una conexión a la base de datos de analytics"""
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False,
+            cached_statements=_STATEMENT_CACHE_SIZE)
+        # WAL + synchronous=NORMAL: cada lote ya no espera dos fsync y las
+        # lecturas no bloquean las escrituras (WAL requiere que el archivo
+        # esté en un sistema de archivos local, no en un recurso de red)
+        conn.executescript('''
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-65536;
+            PRAGMA mmap_size=268435456;
+        ''')
+        return conn
+
     def _init_database(self):
         """Inicializa la base de datos de analytics"""
         try:
@@ -29,112 +183,241 @@ class AnalyticsManager:
             db_path = Path(self.db_path)
             db_path.parent.mkdir(parents=True, exist_ok=True)
 
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS events (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    event_type TEXT NOT NULL,
-                    user_id INTEGER,
-                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    data TEXT,
-                    session_id TEXT
-                )
-            ''')
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS metrics (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    metric_name TEXT NOT NULL,
-                    metric_value INTEGER DEFAULT 0,
-                    date DATE DEFAULT CURRENT_DATE,
-                    UNIQUE(metric_name, date)
-                )
-            ''')
-            conn.commit()
-            conn.close()
+            if self._in_memory:
+                self._conn = sqlite3.connect(
+                    ':memory:', check_same_thread=False,
+                    cached_statements=_STATEMENT_CACHE_SIZE)
+                # Cargar lo guardado en el archivo con la API de backup
+                disk = self._connect()
+                try:
+                    disk.backup(self._conn)
+                finally:
+                    disk.close()
+            else:
+                self._conn = self._connect()
+            with self._lock:
+                self._create_tables()
+
+            self._writer = threading.Thread(
+                target=self._writer_loop, name="analytics-writer", daemon=True)
+            self._writer.start()
+            if self._in_memory:
+                self._snapshotter = threading.Thread(
+                    target=self._snapshot_loop, name="analytics-snapshot", daemon=True)
+                self._snapshotter.start()
+            atexit.register(self.close)
             logger.info("Base de datos de analytics inicializada")
         except Exception as e:
             logger.error(f"Error al inicializar base de datos de analytics: {e}")
 
+    def _create_tables(self):
+        """Crea las tablas de analytics si no existen"""
+        cursor = self._conn.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                metric_name TEXT NOT NULL,
+                metric_value INTEGER DEFAULT 0,
+                date DATE DEFAULT CURRENT_DATE,
+                UNIQUE(metric_name, date)
+            )
+        ''')
+        self._conn.commit()
+
+        legacy = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'events'"
+        ).fetchone()
+        if legacy:
+            self._migrate_legacy_events()
+
+    def _migrate_legacy_events(self):
+        """Reparte la tabla events de versiones anteriores en particiones diarias"""
+        # Todo en una transacción: si se interrumpe, la tabla antigua sigue intacta
+        self._conn.execute('BEGIN')
+        try:
+            # timestamp se guarda en microsegundos Unix; las bases más antiguas
+            # lo guardaban como texto ISO en hora local
+            self._conn.execute('''
+                UPDATE events
+                SET timestamp = CAST(
+                    (julianday(timestamp, 'utc') - 2440587.5) * 86400000000 AS INTEGER)
+                WHERE typeof(timestamp) = 'text'
+            ''')
+            days = [row[0] for row in self._conn.execute('''
+                SELECT DISTINCT strftime('%Y%m%d', timestamp / 1000000, 'unixepoch', 'localtime')
+                FROM events
+            ''')]
+            for day in days:
+                table = _PARTITION_PREFIX + day
+                _create_partition(self._conn, table)
+                self._conn.execute(f'''
+                    INSERT INTO {table} (event_type, user_id, timestamp, data, session_id)
+                    SELECT event_type, user_id, timestamp, data, session_id
+                    FROM events
+                    WHERE strftime('%Y%m%d', timestamp / 1000000, 'unixepoch', 'localtime') = ?
+                ''', (day,))
+            self._conn.execute('DROP TABLE events')
+            self._conn.commit()
+            logger.info(f"Eventos de analytics migrados a {len(days)} particiones diarias")
+        except Exception:
+            self._conn.rollback()
+            raise
+
+    def _events_since(self, since_us: int) -> str:
+        """Subconsulta con las particiones que cubren desde `since_us` hasta hoy"""
+        first = _partition_name(since_us)
+        partitions = [
+            row[0] for row in self._conn.execute(_LIST_PARTITIONS_SQL)
+            if row[0] >= first
+        ]
+        if not partitions:
+            return _NO_EVENTS_SQL
+        # Los filtros de cada consulta se aplican dentro de cada rama del
+        # UNION ALL, con los índices de cada partición
+        return '(' + ' UNION ALL '.join(
+            f'SELECT event_type, user_id, timestamp, data FROM {table}'
+            for table in partitions
+        ) + ')'
+
+    def close(self):
+        """Escribe los eventos pendientes y cierra la base de datos de analytics"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+        if self._snapshotter is not None and self._snapshotter.is_alive():
+            self._snapshot_stop.set()
+            self._snapshotter.join()
+            self.snapshot()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
     def track_event(self, event_type: str, data: Dict[str, Any] = None, user_id: int = None):
         """Registra un evento"""
         try:
             event = {
                 'event_type': event_type,
                 'user_id': user_id,
-                'timestamp': datetime.now().isoformat(),
-                'data': json.dumps(data) if data else None,
+                'timestamp': _now_us(),
+                'data': _dumps(data) if data else None,
                 'session_id': self._get_session_id(user_id)
             }
-            self.events.append(event)
-            self._save_event_to_db(event)
-            self._update_metrics(event_type)
+            self._queue.put(event)
             logger.debug(f"Evento registrado: {event_type}")
         except Exception as e:
             logger.error(f"Error al registrar evento: {e}")
 
-    def _get_session_id(self, user_id: int) -> str:
+    def _get_session_id(self, user_id: int) -> int:
         """Genera o recupera el ID de sesión del usuario"""
-        if user_id not in self.session_data:
-            self.session_data[user_id] = f"session_{user_id}_{int(time.time())}"
-        return self.session_data[user_id]
+        # Inicio de la sesión en segundos Unix: junto con el user_id de la
+        # fila identifica la sesión, sin construir un string por usuario
+        session_id = self.session_data.get(user_id)
+        if session_id is None:
+            session_id = self.session_data[user_id] = int(time.time())
+        return session_id
+
+    def flush(self):
+        """Espera a que el hilo escritor guarde los eventos ya encolados"""
+        if self._writer is None or not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def _writer_loop(self):
+        """Consume la cola y escribe los eventos por lotes"""
+        # En memoria solo existe la conexión compartida: se usa con el lock
+        conn = None if self._in_memory else self._connect()
+        try:
+            while True:
+                batch = [self._queue.get()]
+                deadline = time.monotonic() + _WRITER_WAIT
+                # Acumular hasta llenar el lote o agotar la espera; un flush()
+                # o el cierre no esperan al resto del lote
+                while (len(batch) < _WRITER_BATCH_SIZE
+                       and isinstance(batch[-1], dict)):
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
 
-    def _save_event_to_db(self, event: Dict[str, Any]):
-        """Guarda el evento en la base de datos"""
+                events = [item for item in batch if isinstance(item, dict)]
+                if events and conn is None:
+                    with self._lock:
+                        self._save_events_to_db(self._conn, events)
+                elif events:
+                    self._save_events_to_db(conn, events)
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+                if batch[-1] is _STOP:
+                    break
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _snapshot_loop(self):
+        """Copia periódicamente la base en memoria al archivo"""
+        while not self._snapshot_stop.wait(settings.ANALYTICS_SAVE_INTERVAL):
+            self.snapshot()
+
+    def snapshot(self):
+        """Guarda en el archivo de analytics la base de datos en memoria"""
+        if not self._in_memory:
+            return
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO events (event_type, user_id, timestamp, data, session_id)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
+            disk = sqlite3.connect(self.db_path)
+            try:
+                with self._lock:
+                    if self._conn is not None:
+                        self._conn.backup(disk)
+            finally:
+                disk.close()
+        except Exception as e:
+            logger.error(f"Error al guardar copia de analytics: {e}")
+
+    def _save_events_to_db(self, conn: sqlite3.Connection, events: List[Dict[str, Any]]):
+        """Guarda un lote de eventos en una sola transacción"""
+        rows_by_partition = {}
+        for event in events:
+            rows_by_partition.setdefault(_partition_name(event['timestamp']), []).append((
                 event['event_type'],
                 event['user_id'],
                 event['timestamp'],
                 event['data'],
                 event['session_id']
             ))
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            logger.error(f"Error al guardar evento en DB: {e}")
-
-    def _update_metrics(self, event_type: str):
-        """Actualiza las métricas basadas en el tipo de evento"""
-        today = datetime.now().date().isoformat()
-        metric_key = f"{event_type}_{today}"
-        self.metrics[metric_key] += 1
-        self._save_metric_to_db(event_type, self.metrics[metric_key], today)
-
-    def _save_metric_to_db(self, metric_name: str, value: int, date: str):
-        """Guarda la métrica en la base de datos"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO metrics (metric_name, metric_value, date)
-                VALUES (?, ?, ?)
-            ''', (metric_name, value, date))
+            conn.execute('BEGIN IMMEDIATE')
+            for table, rows in rows_by_partition.items():
+                if table not in self._writer_partitions:
+                    _create_partition(conn, table)
+                conn.executemany(_INSERT_EVENT_SQL.format(table=table), rows)
             conn.commit()
-            conn.close()
+            self._writer_partitions.update(rows_by_partition)
         except Exception as e:
-            logger.error(f"Error al guardar métrica en DB: {e}")
+            conn.rollback()
+            logger.error(f"Error al guardar eventos en DB: {e}")
 
     def get_metrics(self, days: int = 7) -> Dict[str, Any]:
         """Obtiene métricas de los últimos días"""
+        self.flush()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            start_date = (datetime.now() - timedelta(days=days)).date().isoformat()
-            cursor.execute('''
-                SELECT metric_name, SUM(metric_value) as total
-                FROM metrics
-                WHERE date >= ?
-                GROUP BY metric_name
-                ORDER BY total DESC
-            ''', (start_date,))
-            results = cursor.fetchall()
-            conn.close()
+            start = _day_start_us(days)
+            with self._lock:
+                # Se agregan directamente desde events: ya no se escribe una
+                # fila de métricas por cada evento
+                results = self._conn.execute(f'''
+                    SELECT event_type, COUNT(*) as total
+                    FROM {self._events_since(start)}
+                    WHERE timestamp >= ?
+                    GROUP BY event_type
+                    ORDER BY total DESC
+                ''', (start,)).fetchall()
             return {row[0]: row[1] for row in results}
         except Exception as e:
             logger.error(f"Error al obtener métricas: {e}")
@@ -142,66 +425,56 @@ class AnalyticsManager:
 
     def get_user_activity(self, user_id: int, days: int = 7) -> List[Dict[str, Any]]:
         """Obtiene la actividad de un usuario específico"""
+        self.flush()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            start_date = (datetime.now() - timedelta(days=days)).isoformat()
-            cursor.execute('''
-                SELECT event_type, timestamp, data
-                FROM events
-                WHERE user_id = ? AND timestamp >= ?
-                ORDER BY timestamp DESC
-            ''', (user_id, start_date))
-            results = cursor.fetchall()
-            conn.close()
-            return [
-                {
-                    'event_type': row[0],
-                    'timestamp': row[1],
-                    'data': json.loads(row[2]) if row[2] else None
-                }
-                for row in results
-            ]
+            cutoff = _cutoff_us(days)
+            with self._lock:
+                # Cada fila se convierte directamente en su dict al leerla,
+                # sin pasar por la lista intermedia de tuplas
+                cursor = self._conn.cursor()
+                cursor.row_factory = _activity_from_row
+                return cursor.execute(f'''
+                    SELECT event_type, timestamp, data
+                    FROM {self._events_since(cutoff)}
+                    WHERE user_id = ? AND timestamp >= ?
+                    ORDER BY timestamp DESC
+                ''', (user_id, cutoff)).fetchall()
         except Exception as e:
             logger.error(f"Error al obtener actividad del usuario: {e}")
             return []
 
     def get_popular_events(self, days: int = 7, limit: int = 10) -> List[tuple]:
         """Obtiene los eventos más populares"""
+        self.flush()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            start_date = (datetime.now() - timedelta(days=days)).isoformat()
-            cursor.execute('''
-                SELECT event_type, COUNT(*) as count
-                FROM events
-                WHERE timestamp >= ?
-                GROUP BY event_type
-                ORDER BY count DESC
-                LIMIT ?
-            ''', (start_date, limit))
-            results = cursor.fetchall()
-            conn.close()
-            return results
+            cutoff = _cutoff_us(days)
+            with self._lock:
+                return self._conn.execute(f'''
+                    SELECT event_type, COUNT(*) as count
+                    FROM {self._events_since(cutoff)}
+                    WHERE timestamp >= ?
+                    GROUP BY event_type
+                    ORDER BY count DESC
+                    LIMIT ?
+                ''', (cutoff, limit)).fetchall()
         except Exception as e:
             logger.error(f"Error al obtener eventos populares: {e}")
             return []
 
     def get_daily_stats(self, days: int = 7) -> Dict[str, List[int]]:
         """Obtiene estadísticas diarias"""
+        self.flush()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            start_date = (datetime.now() - timedelta(days=days)).date().isoformat()
-            cursor.execute('''
-                SELECT date, COUNT(*) as count
-                FROM events
-                WHERE date >= ?
-                GROUP BY date
-                ORDER BY date
-            ''', (start_date,))
-            results = cursor.fetchall()
-            conn.close()
+            start = _day_start_us(days)
+            with self._lock:
+                results = self._conn.execute(f'''
+                    SELECT date(timestamp / 1000000, 'unixepoch', 'localtime') as day,
+                           COUNT(*) as count
+                    FROM {self._events_since(start)}
+                    WHERE timestamp >= ?
+                    GROUP BY day
+                    ORDER BY day
+                ''', (start,)).fetchall()
             dates = []
             counts = []
             for row in results:
@@ -214,14 +487,24 @@ class AnalyticsManager:
 
     def cleanup_old_data(self, days: int = 30):
         """Limpia datos antiguos de la base de datos"""
+        self.flush()
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
-            cursor.execute('DELETE FROM events WHERE timestamp < ?', (cutoff_date,))
-            cursor.execute('DELETE FROM metrics WHERE date < ?', (cutoff_date,))
-            conn.commit()
-            conn.close()
+            # La retención es por días completos: se eliminan las particiones
+            # anteriores al día del corte, sin borrar filas una a una
+            first_kept = _partition_name(_cutoff_us(days))
+            cutoff_date = (datetime.now() - timedelta(days=days)).date().isoformat()
+            with self._lock:
+                old_partitions = [
+                    row[0] for row in self._conn.execute(_LIST_PARTITIONS_SQL)
+                    if row[0] < first_kept
+                ]
+                # Todo en una sola transacción (rollback si algo falla)
+                with self._conn:
+                    self._conn.execute('DELETE FROM metrics WHERE date < ?', (cutoff_date,))
+                    for table in old_partitions:
+                        self._conn.execute(f'DROP TABLE IF EXISTS {table}')
+                # Devolver al disco el WAL que ha crecido con el borrado
+                self._conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
             logger.info(f"Datos de más de {days} días eliminados")
         except Exception as e:
             logger.error(f"Error al limpiar datos antiguos: {e}")
@@ -3,7 +3,7 @@ Bot principal modularizado
 """
 import time
 from datetime import datetime
-from typing import Dict
+from typing import Awaitable, Callable, Dict, Optional
 
 from ai.cache import response_cache
 from ai.intent_detector import detect_intent
@@ -12,6 +12,7 @@ from analytics.manager import analytics_manager
 from config.settings import settings
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.constants import ParseMode
+from telegram.error import BadRequest
 from telegram.ext import (
     ApplicationBuilder,
     CallbackQueryHandler,
@@ -35,6 +36,9 @@ from bot.callbacks import (
 class HoteleriaBot:
     """Bot de hotelería modularizado con funcionalidades avanzadas"""
 
+    # Segundos mínimos entre ediciones de una respuesta que se está generando
+    STREAM_EDIT_INTERVAL = 1.0
+
     def __init__(self):
         """Inicializa el bot de hotelería"""
         settings.validate()
@@ -300,9 +304,24 @@ class HoteleriaBot:
 
         start_time = time.time()
 
+        # Borrador que se edita mientras la IA genera la respuesta
+        draft = None
+        draft_text = None
+
+        async def show_partial(partial_text: str):
+            nonlocal draft, draft_text
+            try:
+                if draft is None:
+                    draft = await update.message.reply_text(partial_text)
+                else:
+                    await draft.edit_text(partial_text)
+                draft_text = partial_text
+            except Exception as e:
+                logger.debug(f"No se pudo mostrar la respuesta parcial: {e}")
+
         try:
-            # Obtener respuesta de IA
-            response = await self._get_ai_response(sanitized_message)
+            # Obtener respuesta de IA (mostrando el texto a medida que se genera)
+            response = await self._get_ai_response(sanitized_message, show_partial)
 
             # Calcular tiempo de respuesta
             response_time = time.time() - start_time
@@ -316,12 +335,33 @@ class HoteleriaBot:
             formatted_response, keyboard = self._create_rich_response(
                 response, intent)
 
-            # Enviar respuesta
-            await update.message.reply_text(
-                formatted_response,
-                reply_markup=keyboard,
-                parse_mode=ParseMode.MARKDOWN
-            )
+            # Enviar respuesta (reemplazando el borrador si se mostró)
+            if draft is None:
+                await update.message.reply_text(
+                    formatted_response,
+                    reply_markup=keyboard,
+                    parse_mode=ParseMode.MARKDOWN
+                )
+            elif formatted_response != draft_text or keyboard is not None:
+                # Si el borrador ya muestra la respuesta final no se edita:
+                # Telegram rechaza las ediciones que no cambian el mensaje
+                try:
+                    await draft.edit_text(
+                        formatted_response,
+                        reply_markup=keyboard,
+                        parse_mode=ParseMode.MARKDOWN
+                    )
+                except BadRequest as e:
+                    # El usuario ya vio la respuesta en el borrador: se envía
+                    # como mensaje nuevo en lugar de mostrar un error (sin
+                    # Markdown si lo que falló fue el formato)
+                    logger.warning(f"⚠️ No se pudo editar el borrador: {e}")
+                    parse_error = "parse" in str(e).lower()
+                    await update.message.reply_text(
+                        formatted_response,
+                        reply_markup=keyboard,
+                        parse_mode=None if parse_error else ParseMode.MARKDOWN
+                    )
 
             # Actualizar contexto del usuario
             self._update_user_context(user_id, sanitized_message, response)
@@ -335,27 +375,47 @@ class HoteleriaBot:
                 "❌ Lo siento, tuve un problema procesando tu mensaje. Intenta de nuevo."
             )
 
-    async def _get_ai_response(self, message: str) -> str:
-        """Obtiene respuesta de IA"""
+    async def _get_ai_response(
+            self, message: str,
+            on_partial: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """
+        Obtiene respuesta de IA
+
+        on_partial recibe el texto parcial mientras se genera la respuesta.
+        """
         from ai.models import ai_models
         
-        # Verificar cache primero
-        cached_response = response_cache.get(message)
+        # Verificar cache primero (la clave se reutiliza al guardar)
+        cache_key, cached_response = response_cache.get_with_key(message)
         if cached_response:
             return cached_response
 
+        # Preguntas con respuesta determinista: sin búsqueda ni generación
+        from ai.fallback_handler import get_template_response
+        response = get_template_response(message)
+        if response is not None:
+            response_cache.set_with_key(cache_key, message, response)
+            return response
+
         # Buscar contexto relevante según el modo de carga
         if ai_models.use_lazy_loading:
             context_docs = await vectorstore_manager.search_context_async(message)
         else:
             context_docs = vectorstore_manager.search_context(message)
 
-        # Generar respuesta usando IA
-        from ai.text_generator import generate_response_async
-        response = await generate_response_async(message, context_docs)
+        # Generar respuesta usando IA; los parciales llegan como mucho uno por
+        # STREAM_EDIT_INTERVAL (límite de ediciones de Telegram)
+        from ai.text_generator import stream_response_async
+        response = None
+        async for text, final in stream_response_async(
+                message, context_docs, partial_interval=self.STREAM_EDIT_INTERVAL):
+            if final:
+                response = text
+            elif on_partial is not None:
+                await on_partial(text)
 
         # Guardar en cache
-        response_cache.set(message, response)
+        response_cache.set_with_key(cache_key, message, response)
 
         return response
 
@@ -11,7 +11,6 @@ from ai.fallback_handler import (
     get_room_info_from_documents,
     get_smart_welcome_response,
 )
-from ai.text_generator import generate_response
 from ai.vectorstore import vectorstore_manager
 from analytics.manager import analytics_manager
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
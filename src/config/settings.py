@@ -26,7 +26,11 @@ class Settings:
 
     # Configuración de modelos de IA
     CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 500))
-    CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 50))
+    # Sin superposición: con división recursiva los chunks ya cortan en
+    # párrafos/frases y el solapamiento solo repite embeddings
+    CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 0))
+    # Vectores del índice FAISS en int8 (False = float32 para comparar recall)
+    VECTOR_QUANTIZATION = os.getenv('VECTOR_QUANTIZATION', 'true').lower() == 'true'
     TEMPERATURE = float(os.getenv('TEMPERATURE', 0.7))
     MAX_LENGTH = int(os.getenv('MAX_LENGTH', 300))
 
@@ -53,6 +57,8 @@ class Settings:
     ANALYTICS_FILE = project_root / "src" / "data" / "analytics.json"
     FEEDBACK_FILE = project_root / "src" / "data" / "feedback.json"
     USAGE_STATS_FILE = project_root / "src" / "data" / "usage_stats.json"
+    # Índices FAISS persistidos (uno por modelo de embeddings + contenido)
+    VECTORSTORE_CACHE_DIR = project_root / "src" / "data" / "faiss"
 
     # Configuración de cache
     CACHE_DURATION_HOURS = int(os.getenv('CACHE_DURATION_HOURS', 24))
@@ -62,8 +68,18 @@ class Settings:
     ENABLE_MODEL_CACHING = os.getenv(
         'ENABLE_MODEL_CACHING', 'true').lower() == 'true'
     LAZY_LOAD_MODELS = os.getenv('LAZY_LOAD_MODELS', 'true').lower() == 'true'
+    # Precargar en segundo plano los modelos perezosos al arrancar
+    WARMUP_ON_START = os.getenv('WARMUP_ON_START', 'true').lower() == 'true'
     MAX_CONCURRENT_REQUESTS = int(os.getenv('MAX_CONCURRENT_REQUESTS', 10))
 
+    # Modelos cuantizados a INT8 con ONNX Runtime (requiere optimum[onnxruntime])
+    USE_ONNX_MODELS = os.getenv('USE_ONNX_MODELS', 'true').lower() == 'true'
+    ONNX_MODELS_DIR = project_root / "src" / "data" / "onnx"
+    # Cuantización dinámica INT8 de los modelos que se ejecutan en PyTorch
+    QUANTIZE_MODELS = os.getenv('QUANTIZE_MODELS', 'true').lower() == 'true'
+    # Compilar el generador PyTorch con torch.compile (la primera respuesta tarda más)
+    COMPILE_MODELS = os.getenv('COMPILE_MODELS', 'false').lower() == 'true'
+
     # Configuración de respuestas enriquecidas
     ENABLE_EMOJI_FORMATTING = os.getenv(
         'ENABLE_EMOJI_FORMATTING', 'true').lower() == 'true'
@@ -71,6 +87,9 @@ class Settings:
     # Configuración de analíticas
     ENABLE_ANALYTICS = os.getenv('ENABLE_ANALYTICS', 'true').lower() == 'true'
     ANALYTICS_SAVE_INTERVAL = int(os.getenv('ANALYTICS_SAVE_INTERVAL', 10))
+    # Base de analytics en memoria, copiada a disco cada ANALYTICS_SAVE_INTERVAL s
+    ANALYTICS_IN_MEMORY = os.getenv(
+        'ANALYTICS_IN_MEMORY', 'false').lower() == 'true'
 
     # Configuración de monitoreo (deshabilitado - módulo eliminado)
     AUTO_UPDATE_DOCUMENTS = False  # Deshabilitado - sin monitor de documentos
@@ -89,8 +108,12 @@ class Settings:
         if not cls.TELEGRAM_TOKEN:
             raise ValueError("Token de Telegram no encontrado en .env")
 
-        if not cls.DOCUMENTOS_DIR.exists():
-            cls.DOCUMENTOS_DIR.mkdir(parents=True, exist_ok=True)
+        if cls.CHUNK_OVERLAP >= cls.CHUNK_SIZE * 0.3:
+            raise ValueError(
+                "CHUNK_OVERLAP debe ser menor que el 30% de CHUNK_SIZE")
+
+        # exist_ok ya cubre el caso de que exista: no hace falta otro stat()
+        cls.DOCUMENTOS_DIR.mkdir(parents=True, exist_ok=True)
 
         return True
 
@@ -1,7 +1,7 @@
 """
 Adaptador de vectorstore para usar base de datos SQLite
 """
-from typing import List
+from typing import Iterator, List
 
 from database.repository import contenido_repository
 from utils.logger import logger
@@ -13,26 +13,21 @@ class DatabaseVectorStoreAdapter:
     def __init__(self):
         self.repository = contenido_repository
 
+    def iter_documents_for_vectorstore(self) -> Iterator[dict]:
+        """
+        Genera los documentos de la base de datos formateados para vectorstore
+
+        Cada documento se formatea al pedirlo: quien los consume de uno en uno
+        no mantiene todo el corpus formateado en memoria a la vez.
+        """
+        # Un solo SELECT (fetchall) para todo el contenido activo
+        for item in self.repository.obtener_todo_contenido():
+            yield self._formatear_documento(item)
+
     def get_all_documents_for_vectorstore(self) -> List[dict]:
         """Obtiene todos los documentos de la base de datos formateados para vectorstore"""
         try:
-            contenido = self.repository.obtener_todo_contenido()
-            documentos_vectorstore = []
-
-            for item in contenido:
-                # Crear un documento formateado para el vectorstore
-                documento = {
-                    'page_content': self._formatear_contenido_para_vectorstore(item),
-                    'metadata': {
-                        'id': item['id'],
-                        'categoria': item['categoria'],
-                        'titulo': item['titulo'],
-                        'precio': item.get('precio'),
-                        'source': f"db_{item['categoria']}_{item['id']}",
-                        **item.get('metadatos', {})
-                    }
-                }
-                documentos_vectorstore.append(documento)
+            documentos_vectorstore = list(self.iter_documents_for_vectorstore())
 
             logger.info(
                 f"✅ Preparados {len(documentos_vectorstore)} documentos de la base de datos para vectorstore")
@@ -47,21 +42,8 @@ class DatabaseVectorStoreAdapter:
         """Obtiene documentos por categoría específica"""
         try:
             contenido = self.repository.obtener_por_categoria(categoria)
-            documentos_vectorstore = []
-
-            for item in contenido:
-                documento = {
-                    'page_content': self._formatear_contenido_para_vectorstore(item),
-                    'metadata': {
-                        'id': item['id'],
-                        'categoria': item['categoria'],
-                        'titulo': item['titulo'],
-                        'precio': item.get('precio'),
-                        'source': f"db_{item['categoria']}_{item['id']}",
-                        **item.get('metadatos', {})
-                    }
-                }
-                documentos_vectorstore.append(documento)
+            documentos_vectorstore = [
+                self._formatear_documento(item) for item in contenido]
 
             logger.info(
                 f"✅ Preparados {len(documentos_vectorstore)} documentos de categoría '{categoria}'")
@@ -72,6 +54,20 @@ class DatabaseVectorStoreAdapter:
                 f"❌ Error al obtener documentos de categoría '{categoria}': {e}")
             return []
 
+    def _formatear_documento(self, item: dict) -> dict:
+        """Crea un documento formateado para el vectorstore (campos de Document)"""
+        return {
+            'page_content': self._formatear_contenido_para_vectorstore(item),
+            'metadata': {
+                'id': item['id'],
+                'categoria': item['categoria'],
+                'titulo': item['titulo'],
+                'precio': item.get('precio'),
+                'source': f"db_{item['categoria']}_{item['id']}",
+                **item.get('metadatos', {})
+            }
+        }
+
     def _formatear_contenido_para_vectorstore(self, item: dict) -> str:
         """Formatea el contenido de la base de datos para el vectorstore"""
         # Combinar título y contenido para mejor búsqueda semántica
@@ -2,7 +2,8 @@
 Repositorio para gestión de contenido del hotel
 """
 import json
-from typing import Dict, List, Optional
+import threading
+from typing import Dict, Hashable, List, Optional, Tuple
 
 from database.connection import db_connection
 from utils.logger import logger
@@ -13,9 +14,72 @@ class ContenidoHotelRepository:
 
     def __init__(self):
         self.conn = db_connection.get_connection()
+        # Cache en memoria de las consultas de lectura: el contenido cambia
+        # muy poco y cada respuesta del bot repite las mismas consultas
+        self._read_cache: Dict[Hashable, List[Dict]] = {}
+        self._data_version: Optional[int] = None
+        # Generación del contenido: aumenta cada vez que se invalida el cache
+        self._generation = 0
+        self._cache_lock = threading.Lock()
+
+    def _refresh_data_version(self):
+        """
+        Invalida el cache si otra conexión confirmó cambios (requiere _cache_lock)
+
+        PRAGMA data_version cambia cuando otra conexión confirma cambios en la
+        base de datos; las escrituras propias invalidan el cache explícitamente.
+        """
+        data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self._data_version:
+            self._read_cache.clear()
+            self._data_version = data_version
+            self._generation += 1
+
+    def _get_cached(self, cache_key: Hashable) -> Tuple[Optional[List[Dict]], int]:
+        """
+        Retorna una copia de la lista cacheada (None si no está o quedó
+        obsoleta) y la generación del contenido en ese momento
+
+        Los diccionarios se comparten entre llamadas y no deben modificarse.
+        """
+        with self._cache_lock:
+            self._refresh_data_version()
+            cached = self._read_cache.get(cache_key)
+            return (list(cached) if cached is not None else None), self._generation
+
+    def _store_cached(self, cache_key: Hashable, contenido: List[Dict], generation: int):
+        """
+        Guarda el resultado de una consulta de lectura
+
+        Si el cache se invalidó mientras se consultaba (la generación cambió),
+        el resultado puede estar obsoleto y no se guarda.
+        """
+        with self._cache_lock:
+            if generation == self._generation:
+                self._read_cache[cache_key] = list(contenido)
+
+    def invalidar_cache(self):
+        """Descarta los resultados cacheados tras modificar el contenido"""
+        with self._cache_lock:
+            self._read_cache.clear()
+            self._generation += 1
+
+    def obtener_version_contenido(self) -> int:
+        """
+        Retorna un número que cambia cada vez que cambia el contenido
+
+        Permite a los servicios cachear respuestas derivadas del contenido.
+        """
+        with self._cache_lock:
+            self._refresh_data_version()
+            return self._generation
 
     def obtener_todo_contenido(self) -> List[Dict]:
         """Obtiene todo el contenido activo del hotel"""
+        cached, generation = self._get_cached(('todo',))
+        if cached is not None:
+            return cached
+
         try:
             cursor = self.conn.cursor()
             cursor.execute('''
@@ -40,6 +104,7 @@ class ContenidoHotelRepository:
                 }
                 contenido.append(item)
 
+            self._store_cached(('todo',), contenido, generation)
             logger.info(f"✅ Obtenidos {len(contenido)} elementos de contenido")
             return contenido
 
@@ -49,6 +114,10 @@ class ContenidoHotelRepository:
 
     def obtener_por_categoria(self, categoria: str) -> List[Dict]:
         """Obtiene contenido por categoría específica"""
+        cached, generation = self._get_cached(('categoria', categoria))
+        if cached is not None:
+            return cached
+
         try:
             cursor = self.conn.cursor()
             cursor.execute('''
@@ -73,6 +142,7 @@ class ContenidoHotelRepository:
                 }
                 contenido.append(item)
 
+            self._store_cached(('categoria', categoria), contenido, generation)
             logger.info(
                 f"✅ Obtenidos {len(contenido)} elementos para categoría '{categoria}'")
             return contenido
@@ -84,6 +154,11 @@ class ContenidoHotelRepository:
 
     def buscar_contenido(self, termino: str) -> List[Dict]:
         """Busca contenido por término en título y contenido"""
+        cache_key = ('busqueda', termino)
+        cached, generation = self._get_cached(cache_key)
+        if cached is not None:
+            return cached
+
         try:
             cursor = self.conn.cursor()
             termino = f"%{termino}%"
@@ -109,6 +184,7 @@ class ContenidoHotelRepository:
                 }
                 contenido.append(item)
 
+            self._store_cached(cache_key, contenido, generation)
             logger.info(
                 f"✅ Búsqueda '{termino}' encontró {len(contenido)} resultados")
             return contenido
@@ -132,6 +208,7 @@ class ContenidoHotelRepository:
 
             contenido_id = cursor.lastrowid
             self.conn.commit()
+            self.invalidar_cache()
 
             logger.info(
                 f"✅ Contenido agregado con ID {contenido_id}: '{titulo}'")
@@ -194,6 +271,7 @@ class ContenidoHotelRepository:
             '''
             cursor.execute(query, valores)
             self.conn.commit()
+            self.invalidar_cache()
 
             logger.info(f"✅ Contenido actualizado: ID {contenido_id}")
             return True
@@ -215,6 +293,7 @@ class ContenidoHotelRepository:
 
             if cursor.rowcount > 0:
                 self.conn.commit()
+                self.invalidar_cache()
                 logger.info(
                     f"✅ Contenido marcado como inactivo: ID {contenido_id}")
                 return True
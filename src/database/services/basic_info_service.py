@@ -8,6 +8,23 @@ from typing import Optional
 
 from database.repository import contenido_repository
 from utils.logger import logger
+from utils.text_processor import split_lines
+
+# Vocales acentuadas y letras con diacríticos frecuentes en español (ya en
+# minúsculas) -> letra base; equivale a NFD + eliminar las marcas 'Mn'
+_ACCENT_TABLE = str.maketrans(
+    'áéíóúàèìòùâêîôûäëïöüñç',
+    'aeiouaeiouaeiouaeiounc'
+)
+_NON_WORD_RE = re.compile(r'[^\w\s]')
+_SPACES_RE = re.compile(r'\s+')
+
+# Saludo, emoji y mensaje de cada franja horaria (índice de get_time_bucket)
+TIME_BUCKETS = (
+    ("¡Buenos días!", "🌅", "Esperamos que tengas un excelente día"),
+    ("¡Buenas tardes!", "☀️", "Esperamos que estés teniendo una buena tarde"),
+    ("¡Buenas noches!", "🌙", "Esperamos que tengas una agradable noche"),
+)
 
 
 def get_hotel_name_from_documents() -> str:
@@ -20,7 +37,7 @@ def get_hotel_name_from_documents() -> str:
             contenido = item['contenido'].upper()
             if 'HOTEL' in contenido:
                 # Extraer nombre del hotel
-                lineas = item['contenido'].split('\n')
+                lineas = split_lines(item['contenido'])
                 for linea in lineas:
                     if 'HOTEL' in linea.upper() and len(linea.strip()) < 100:
                         # Limpiar la línea del nombre del hotel
@@ -46,14 +63,15 @@ def get_contact_snippet_from_db() -> Optional[str]:
         info_contacto = contenido_repository.buscar_contenido('teléfono')
         if info_contacto:
             contenido = info_contacto[0]['contenido']
-            # Extraer líneas relevantes
-            lineas = contenido.split('\n')
-            snippet = ""
-            for linea in lineas[:3]:  # Primeras 3 líneas
-                if linea.strip() and any(char.isdigit() for char in linea):
-                    snippet += linea.strip() + "\n"
+            # Extraer líneas relevantes: solo se miran las primeras 3 líneas
+            # (la tupla memoizada se corta sin recorrer el resto del contenido)
+            snippet_lines = []
+            for linea in split_lines(contenido)[:3]:
+                linea = linea.strip()
+                if linea and any(char.isdigit() for char in linea):
+                    snippet_lines.append(linea)
 
-            return snippet.strip() if snippet else None
+            return "\n".join(snippet_lines) if snippet_lines else None
 
         return None
 
@@ -62,17 +80,20 @@ def get_contact_snippet_from_db() -> Optional[str]:
         return None
 
 
-def get_time_based_greeting() -> str:
-    """Genera saludo basado en la hora del día"""
-    now = datetime.now()
-    hour = now.hour
+def get_time_bucket() -> int:
+    """Obtiene la franja horaria actual: 0 mañana, 1 tarde, 2 noche"""
+    hour = datetime.now().hour
 
     if 5 <= hour < 12:
-        return "¡Buenos días!"
+        return 0
     elif 12 <= hour < 18:
-        return "¡Buenas tardes!"
-    else:
-        return "¡Buenas noches!"
+        return 1
+    return 2
+
+
+def get_time_based_greeting() -> str:
+    """Genera saludo basado en la hora del día"""
+    return TIME_BUCKETS[get_time_bucket()][0]
 
 
 def get_default_welcome() -> str:
@@ -107,15 +128,19 @@ def normalize_text(text: str) -> str:
     # Convertir a minúsculas
     text = text.lower()
 
-    # Remover acentos
-    text = unicodedata.normalize('NFD', text)
-    text = ''.join(char for char in text if unicodedata.category(char) != 'Mn')
+    # Remover acentos: tabla de traducción en una sola pasada; la
+    # descomposición NFD solo se necesita si quedan otros caracteres no ASCII
+    if not text.isascii():
+        text = text.translate(_ACCENT_TABLE)
+        if not text.isascii():
+            text = unicodedata.normalize('NFD', text)
+            text = ''.join(char for char in text if unicodedata.category(char) != 'Mn')
 
     # Remover signos de puntuación y caracteres especiales, mantener solo letras y números
-    text = re.sub(r'[^\w\s]', ' ', text)
+    text = _NON_WORD_RE.sub(' ', text)
 
     # Remover espacios extra
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = _SPACES_RE.sub(' ', text).strip()
 
     return text
 
@@ -3,6 +3,7 @@ Servicio especializado en información de contacto y reservas
 """
 from database.repository import contenido_repository
 from utils.logger import logger
+from utils.text_processor import split_lines
 
 
 def get_contact_info_from_documents() -> str:
@@ -34,20 +35,21 @@ Por favor contacta a la recepción del hotel para obtener los datos actualizados
             response += "─" * (len(titulo) + 4) + "\n"
 
             # Procesar el contenido línea por línea para mejor formato
-            lineas = contenido.split('\n')
+            lineas = split_lines(contenido)
             for linea in lineas:
                 linea = linea.strip()
                 if linea:
+                    linea_lower = linea.lower()  # una sola vez por línea
                     # Agregar emojis según el tipo de información
-                    if any(word in linea.lower() for word in ['teléfono', 'tel', 'phone']):
+                    if any(word in linea_lower for word in ['teléfono', 'tel', 'phone']):
                         response += f"📱 {linea}\n"
-                    elif any(word in linea.lower() for word in ['email', 'correo', '@']):
+                    elif any(word in linea_lower for word in ['email', 'correo', '@']):
                         response += f"📧 {linea}\n"
-                    elif any(word in linea.lower() for word in ['dirección', 'direccion', 'address']):
+                    elif any(word in linea_lower for word in ['dirección', 'direccion', 'address']):
                         response += f"📍 {linea}\n"
-                    elif any(word in linea.lower() for word in ['horario', 'hora', 'abierto']):
+                    elif any(word in linea_lower for word in ['horario', 'hora', 'abierto']):
                         response += f"🕐 {linea}\n"
-                    elif any(word in linea.lower() for word in ['web', 'www', 'http']):
+                    elif any(word in linea_lower for word in ['web', 'www', 'http']):
                         response += f"🌐 {linea}\n"
                     else:
                         response += f"ℹ️ {linea}\n"
@@ -125,22 +127,23 @@ def get_reservation_info() -> str:
             response += "─" * (len(titulo) + 4) + "\n"
 
             # Procesar contenido con formato mejorado
-            lineas = contenido.split('\n')
+            lineas = split_lines(contenido)
             for linea in lineas:
                 linea = linea.strip()
                 if linea:
+                    linea_lower = linea.lower()  # una sola vez por línea
                     # Agregar iconos según el contexto
-                    if any(word in linea.lower() for word in ['cancelación', 'cancelacion', 'cancel']):
+                    if any(word in linea_lower for word in ['cancelación', 'cancelacion', 'cancel']):
                         response += f"❌ {linea}\n"
-                    elif any(word in linea.lower() for word in ['política', 'politica', 'policy']):
+                    elif any(word in linea_lower for word in ['política', 'politica', 'policy']):
                         response += f"📋 {linea}\n"
-                    elif any(word in linea.lower() for word in ['precio', 'costo', 'tarifa']):
+                    elif any(word in linea_lower for word in ['precio', 'costo', 'tarifa']):
                         response += f"💰 {linea}\n"
-                    elif any(word in linea.lower() for word in ['check-in', 'entrada', 'llegada']):
+                    elif any(word in linea_lower for word in ['check-in', 'entrada', 'llegada']):
                         response += f"🔑 {linea}\n"
-                    elif any(word in linea.lower() for word in ['check-out', 'salida']):
+                    elif any(word in linea_lower for word in ['check-out', 'salida']):
                         response += f"🚪 {linea}\n"
-                    elif any(word in linea.lower() for word in ['horario', 'hora']):
+                    elif any(word in linea_lower for word in ['horario', 'hora']):
                         response += f"🕐 {linea}\n"
                     else:
                         response += f"ℹ️ {linea}\n"
@@ -153,10 +156,10 @@ def get_reservation_info() -> str:
             response += "📞 **Contacto para Reservas:**\n"
             # Extraer solo la información relevante de contacto
             contenido_contacto = contacto_info[0]['contenido']
-            lineas = contenido_contacto.split('\n')
-            for linea in lineas[:2]:  # Solo primeras 2 líneas
-                if linea.strip() and any(char.isdigit() for char in linea):
-                    response += f"📱 {linea.strip()}\n"
+            for linea in split_lines(contenido_contacto)[:2]:  # Solo primeras 2 líneas
+                linea = linea.strip()
+                if linea and any(char.isdigit() for char in linea):
+                    response += f"📱 {linea}\n"
             response += "\n"
 
         response += "═" * 40 + "\n"
@@ -6,6 +6,7 @@ from typing import Any, Dict
 
 from database.repository import contenido_repository
 from utils.logger import logger
+from utils.text_processor import split_lines
 
 
 def get_restaurant_info_from_documents() -> str:
@@ -94,7 +95,7 @@ def get_amenities_info_from_documents() -> str:
                 response += "─" * (len(titulo) + 8) + "\n"
 
                 # Limpiar y formatear contenido
-                contenido = '\n'.join(line.strip() for line in contenido.split('\n') if line.strip())
+                contenido = '\n'.join(line.strip() for line in split_lines(contenido) if line.strip())
 
                 if len(contenido) > 200:
                     sentences = contenido.split('. ')
@@ -152,7 +153,7 @@ def get_amenities_info_from_documents() -> str:
 def _format_restaurant_content(contenido: str) -> str:
     """Formatea el contenido de un restaurante"""
     # Remover espacios en blanco excesivos al inicio de líneas
-    contenido = '\n'.join(line.strip() for line in contenido.split('\n') if line.strip())
+    contenido = '\n'.join(line.strip() for line in split_lines(contenido) if line.strip())
 
     # Truncar contenido si es muy largo pero mantener párrafos completos
     if len(contenido) > 250:
@@ -167,7 +168,7 @@ def _format_restaurant_content(contenido: str) -> str:
 
 def _format_amenity_content(contenido: str) -> str:
     """Formatea el contenido de una amenidad"""
-    contenido = '\n'.join(line.strip() for line in contenido.split('\n') if line.strip())
+    contenido = '\n'.join(line.strip() for line in split_lines(contenido) if line.strip())
 
     if len(contenido) > 200:
         sentences = contenido.split('. ')
@@ -186,17 +187,9 @@ def _get_restaurant_metadata(restaurante: Dict[str, Any]) -> Dict[str, Any]:
         try:
             metadatos = json.loads(metadatos)
         except Exception:
-            metadatos = {}
-    return metadatos
-
-
-def _get_amenity_metadata(amenidad: Dict[str, Any]) -> Dict[str, Any]:
-    """Obtiene y parsea los metadatos de una amenidad"""
-    metadatos = amenidad.get('metadatos', {})
-    if isinstance(metadatos, str):
-        try:
-            metadatos = json.loads(metadatos)
-        except Exception:
+            # No ocultar metadatos mal formados: quedan en el log de depuración
+            logger.debug("Metadatos inválidos para restaurante %s",
+                         restaurante.get('titulo'), exc_info=True)
             metadatos = {}
     return metadatos
 
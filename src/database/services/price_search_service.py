@@ -1,12 +1,36 @@
 """
 Servicio especializado en búsqueda de habitaciones por precio
 """
+import json
 import re
 from typing import Any, Dict, List
 
 from database.services.room_service import get_rooms_with_prices
 from utils.logger import logger
 
+# Patrones para extraer precios (ordenados por prioridad), compilados una sola vez
+_PRICE_PATTERNS = (
+    re.compile(r'\$\s*(\d+)'),                  # $150, $ 150
+    re.compile(r'(\d+)\s*dolares?'),            # 150 dolares, 150 dolar
+    re.compile(r'(\d+)\s*usd'),                 # 150 usd, 150USD
+    re.compile(r'(\d+)\s*pesos?'),              # 150 pesos, 150 peso
+    re.compile(r'precio\s+de\s+(\d+)'),         # precio de 150
+    re.compile(r'cuesta\s+(\d+)'),              # cuesta 150
+    re.compile(r'vale\s+(\d+)'),                # vale 150
+    re.compile(r'(\d+)\s*euros?'),              # 150 euros, 150 euro
+    re.compile(r'de\s+(\d+)\s*dolares?'),       # de 150 dolares
+    re.compile(r'de\s+(\d+)\s*usd'),            # de 150 usd
+    re.compile(r'de\s+(\d+)(?:\s|$)'),          # de 150 (al final o seguido de espacio)
+    re.compile(r'habitacion\s+de\s+(\d+)'),     # habitacion de 150
+    re.compile(r'cuarto\s+de\s+(\d+)'),         # cuarto de 150
+    re.compile(r'room\s+de\s+(\d+)'),           # room de 150
+    re.compile(r'por\s+(\d+)'),                 # por 150
+    re.compile(r'a\s+(\d+)'),                   # a 150
+    re.compile(r'(\d+)\s*$'),                   # solo número al final: "150"
+    re.compile(r'y\s+de\s+(\d+)'),              # y de 150
+    re.compile(r'(\d{2,4})(?!\d)'),             # cualquier número de 2-4 dígitos (100-9999)
+)
+
 
 def get_room_by_price(target_price: float, tolerance: float = 50.0) -> str:
     """
@@ -54,31 +78,8 @@ def extract_price_from_query(query: str) -> float:
     # Normalizar query
     query = query.lower()
 
-    # Patrones para extraer precios (ordenados por prioridad)
-    patterns = [
-        r'\$\s*(\d+)',                    # $150, $ 150
-        r'(\d+)\s*dolares?',              # 150 dolares, 150 dolar
-        r'(\d+)\s*usd',                   # 150 usd, 150USD
-        r'(\d+)\s*pesos?',                # 150 pesos, 150 peso
-        r'precio\s+de\s+(\d+)',           # precio de 150
-        r'cuesta\s+(\d+)',                # cuesta 150
-        r'vale\s+(\d+)',                  # vale 150
-        r'(\d+)\s*euros?',                # 150 euros, 150 euro
-        r'de\s+(\d+)\s*dolares?',         # de 150 dolares
-        r'de\s+(\d+)\s*usd',              # de 150 usd
-        r'de\s+(\d+)(?:\s|$)',            # de 150 (al final o seguido de espacio)
-        r'habitacion\s+de\s+(\d+)',       # habitacion de 150
-        r'cuarto\s+de\s+(\d+)',           # cuarto de 150
-        r'room\s+de\s+(\d+)',             # room de 150
-        r'por\s+(\d+)',                   # por 150
-        r'a\s+(\d+)',                     # a 150
-        r'(\d+)\s*$',                     # solo número al final: "150"
-        r'y\s+de\s+(\d+)',                # y de 150
-        r'(\d{2,4})(?!\d)',               # cualquier número de 2-4 dígitos (100-9999)
-    ]
-
-    for pattern in patterns:
-        matches = re.findall(pattern, query)
+    for pattern in _PRICE_PATTERNS:
+        matches = pattern.findall(query)
         for match in matches:
             try:
                 price = float(match)
@@ -212,12 +213,13 @@ def _format_no_matches_response(rooms_with_prices: List[Dict[str, Any]], target_
 
 def _get_room_metadata_for_price_search(habitacion: Dict[str, Any]) -> Dict[str, Any]:
     """Obtiene metadatos de habitación para búsqueda por precio"""
-    import json
-
     metadatos = habitacion.get('metadatos', {})
     if isinstance(metadatos, str):
         try:
             metadatos = json.loads(metadatos)
         except Exception:
+            # No ocultar metadatos mal formados: quedan en el log de depuración
+            logger.debug("Metadatos inválidos para habitación %s",
+                         habitacion.get('titulo'), exc_info=True)
             metadatos = {}
     return metadatos
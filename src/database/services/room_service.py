@@ -1,11 +1,47 @@
 """
 Servicio especializado en información de habitaciones
 """
+import operator
 import re
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from database.repository import contenido_repository
 from utils.logger import logger
+from utils.text_processor import split_lines
+
+# Precio en el texto libre de una habitación, p. ej. "$120" o "$ 120"
+_PRICE_RE = re.compile(r'\$\s*(\d+)')
+
+
+def _select_room_by_price(habitaciones: List[Dict[str, Any]],
+                          is_better: Callable[[float, float], bool],
+                          initial: float) -> Tuple[Optional[Dict[str, Any]], float]:
+    """
+    Selecciona la habitación con el precio ganador en una sola pasada
+
+    El campo precio tiene prioridad; los precios escritos en el contenido solo
+    se usan si ninguna habitación tiene un precio directo válido, por lo que
+    el contenido deja de analizarse en cuanto aparece uno.
+
+    Returns:
+        Tuple: (habitación o None, precio ganador)
+    """
+    best_room, best_price = None, initial
+    text_room, text_price = None, initial
+
+    for habitacion in habitaciones:
+        precio = habitacion.get('precio', 0)
+        if precio and is_better(precio, best_price):
+            best_room, best_price = habitacion, precio
+        elif best_room is None:
+            for precio_str in _PRICE_RE.findall(habitacion['contenido']):
+                precio = float(precio_str)
+                if is_better(precio, text_price):
+                    text_room, text_price = habitacion, precio
+
+    if best_room is not None:
+        return best_room, best_price
+    return text_room, text_price
 
 
 def get_room_info_from_documents() -> str:
@@ -23,58 +59,59 @@ def get_room_info_from_documents() -> str:
 
 Por favor contacta a la recepción para información actualizada sobre nuestras habitaciones."""
 
-        response = "🏠 **NUESTRAS HABITACIONES**\n"
-        response += "═" * 40 + "\n\n"
+        # Las partes se acumulan en una lista y se unen una sola vez al final
+        parts = ["🏠 **NUESTRAS HABITACIONES**\n", "═" * 40 + "\n\n"]
 
         for i, habitacion in enumerate(habitaciones, 1):
             titulo = habitacion.get('titulo', f'Habitación {i}')
             contenido = habitacion.get('contenido', '')
             precio = habitacion.get('precio', 0)
 
-            response += f"🛏️ **{titulo}**\n"
-            response += "─" * (len(titulo) + 4) + "\n"
+            parts.append(f"🛏️ **{titulo}**\n")
+            parts.append("─" * (len(titulo) + 4) + "\n")
 
             # Mostrar precio si está disponible
             if precio:
-                response += f"💰 **Precio:** ${precio:.0f} USD por noche\n\n"
+                parts.append(f"💰 **Precio:** ${precio:.0f} USD por noche\n\n")
 
             # Procesar contenido línea por línea
-            lineas = contenido.split('\n')
+            lineas = split_lines(contenido)
             for linea in lineas:
                 linea = linea.strip()
                 if linea:
+                    linea_lower = linea.lower()  # una sola vez por línea
                     # Agregar iconos según el contenido
-                    if any(word in linea.lower() for word in ['precio', 'costo', '$']):
-                        response += f"💰 {linea}\n"
-                    elif any(word in linea.lower() for word in ['cama', 'bed', 'doble', 'king', 'queen']):
-                        response += f"🛏️ {linea}\n"
-                    elif any(word in linea.lower() for word in ['baño', 'bathroom', 'ducha']):
-                        response += f"🚿 {linea}\n"
-                    elif any(word in linea.lower() for word in ['vista', 'view', 'mar', 'jardín']):
-                        response += f"🌅 {linea}\n"
-                    elif any(word in linea.lower() for word in ['wifi', 'internet', 'tv', 'aire']):
-                        response += f"📺 {linea}\n"
-                    elif any(word in linea.lower() for word in ['metros', 'm2', 'tamaño', 'espacio']):
-                        response += f"📐 {linea}\n"
-                    elif any(word in linea.lower() for word in ['huésped', 'persona', 'ocupan']):
-                        response += f"👥 {linea}\n"
+                    if any(word in linea_lower for word in ['precio', 'costo', '$']):
+                        parts.append(f"💰 {linea}\n")
+                    elif any(word in linea_lower for word in ['cama', 'bed', 'doble', 'king', 'queen']):
+                        parts.append(f"🛏️ {linea}\n")
+                    elif any(word in linea_lower for word in ['baño', 'bathroom', 'ducha']):
+                        parts.append(f"🚿 {linea}\n")
+                    elif any(word in linea_lower for word in ['vista', 'view', 'mar', 'jardín']):
+                        parts.append(f"🌅 {linea}\n")
+                    elif any(word in linea_lower for word in ['wifi', 'internet', 'tv', 'aire']):
+                        parts.append(f"📺 {linea}\n")
+                    elif any(word in linea_lower for word in ['metros', 'm2', 'tamaño', 'espacio']):
+                        parts.append(f"📐 {linea}\n")
+                    elif any(word in linea_lower for word in ['huésped', 'persona', 'ocupan']):
+                        parts.append(f"👥 {linea}\n")
                     else:
-                        response += f"✨ {linea}\n"
+                        parts.append(f"✨ {linea}\n")
 
             # Mostrar metadatos si existen
             metadatos = habitacion.get('metadatos', {})
             if metadatos:
-                response += "\n📊 **Detalles adicionales:**\n"
+                parts.append("\n📊 **Detalles adicionales:**\n")
                 for key, value in metadatos.items():
                     if value:
-                        response += f"• **{key.title()}:** {value}\n"
+                        parts.append(f"• **{key.title()}:** {value}\n")
 
-            response += "\n" + "─" * 40 + "\n\n"
+            parts.append("\n" + "─" * 40 + "\n\n")
 
-        response += "═" * 40 + "\n"
-        response += "📞 **¿Interesado?** Contacta recepción para reservar"
+        parts.append("═" * 40 + "\n")
+        parts.append("📞 **¿Interesado?** Contacta recepción para reservar")
 
-        return response
+        return "".join(parts)
 
     except Exception as e:
         logger.error(f"❌ Error obteniendo información de habitaciones desde BD: {e}")
@@ -87,78 +124,50 @@ No pudimos obtener la información de habitaciones en este momento.
 Por favor contacta directamente a recepción."""
 
 
-def get_cheapest_room_info() -> str:
-    """Obtiene información de la habitación más barata"""
-    try:
-        habitaciones = contenido_repository.obtener_por_categoria('habitaciones')
-        if not habitaciones:
-            habitaciones = contenido_repository.buscar_contenido('habitación')
-
-        if not habitaciones:
-            return "🏠 **HABITACIONES**\n\nInformación de habitaciones no disponible."
-
-        # Buscar la habitación más económica usando el campo precio directamente
-        precio_min = float('inf')
-        habitacion_barata = None
+# Variantes de la habitación destacada: solo cambian el criterio y los textos
+_CHEAPEST_ROOM = {
+    'is_better': operator.lt,
+    'initial': float('inf'),
+    'header': "💰 **HABITACIÓN MÁS ECONÓMICA**",
+    'title_emoji': "🛏️",
+    'price_emoji': "💵",
+    'features_title': "📊 **Características principales:**",
+    'description_title': "📝 **Descripción:**",
+    'description_lines': 3,
+    'line_emoji': "✨",
+    'footer': "📞 **Reserva ahora:** Contacta recepción para disponibilidad",
+    'log_label': "habitación más barata",
+    'error_message': "🏠 Error obteniendo información de habitaciones baratas.",
+}
+
+_MOST_EXPENSIVE_ROOM = {
+    'is_better': operator.gt,
+    'initial': 0,
+    'header': "👑 **HABITACIÓN MÁS LUJOSA**",
+    'title_emoji': "🏨",
+    'price_emoji': "💎",
+    'features_title': "✨ **Características exclusivas:**",
+    'description_title': "📝 **Descripción premium:**",
+    'description_lines': 4,  # Primeras 4 líneas para habitación premium
+    'line_emoji': "🌟",
+    'footer': "🎉 **¡Experiencia de lujo!** Contacta recepción para reservar",
+    'log_label': "habitación más cara",
+    'error_message': "🏠 Error obteniendo información de habitaciones de lujo.",
+}
 
-        for habitacion in habitaciones:
-            precio = habitacion.get('precio', 0)
-            if precio and precio < precio_min:
-                precio_min = precio
-                habitacion_barata = habitacion
-
-        # Si no hay precios directos, buscar en el contenido
-        if not habitacion_barata:
-            for habitacion in habitaciones:
-                contenido = habitacion['contenido'].lower()
-                precios = re.findall(r'\$\s*(\d+)', contenido)
-                for precio_str in precios:
-                    precio = float(precio_str)
-                    if precio < precio_min:
-                        precio_min = precio
-                        habitacion_barata = habitacion
-
-        if habitacion_barata:
-            response = "💰 **HABITACIÓN MÁS ECONÓMICA**\n"
-            response += "═" * 40 + "\n\n"
-            response += f"🛏️ **{habitacion_barata['titulo']}**\n"
-            response += "─" * (len(habitacion_barata['titulo']) + 4) + "\n"
-            response += f"💵 **Precio:** ${precio_min:.0f} USD por noche\n\n"
-
-            # Obtener metadatos
-            metadatos = habitacion_barata.get('metadatos', {})
-            if metadatos:
-                response += "📊 **Características principales:**\n"
-                for key, value in metadatos.items():
-                    if value:
-                        response += f"• **{key.title()}:** {value}\n"
-                response += "\n"
-
-            # Procesar descripción
-            contenido = habitacion_barata.get('contenido', '')
-            if contenido:
-                response += "📝 **Descripción:**\n"
-                lineas = contenido.split('\n')
-                for linea in lineas[:3]:  # Solo primeras 3 líneas
-                    linea = linea.strip()
-                    if linea and '$' not in linea:  # Evitar duplicar precio
-                        response += f"✨ {linea}\n"
-                response += "\n"
-
-            response += "═" * 40 + "\n"
-            response += "📞 **Reserva ahora:** Contacta recepción para disponibilidad"
-
-            return response
-        else:
-            return "🏠 **HABITACIONES**\n\nNo se encontraron precios disponibles."
 
-    except Exception as e:
-        logger.error(f"❌ Error obteniendo habitación más barata: {e}")
-        return "🏠 Error obteniendo información de habitaciones baratas."
+def get_cheapest_room_info() -> str:
+    """Obtiene información de la habitación más barata"""
+    return _get_highlighted_room_info(_CHEAPEST_ROOM)
 
 
 def get_most_expensive_room_info() -> str:
     """Obtiene información de la habitación más cara"""
+    return _get_highlighted_room_info(_MOST_EXPENSIVE_ROOM)
+
+
+def _get_highlighted_room_info(variant: Dict[str, Any]) -> str:
+    """Obtiene la información de la habitación destacada según la variante"""
     try:
         habitaciones = contenido_repository.obtener_por_categoria('habitaciones')
         if not habitaciones:
@@ -167,64 +176,49 @@ def get_most_expensive_room_info() -> str:
         if not habitaciones:
             return "🏠 **HABITACIONES**\n\nInformación de habitaciones no disponible."
 
-        # Buscar la habitación más cara usando el campo precio directamente
-        precio_max = 0
-        habitacion_cara = None
+        # Buscar la habitación ganadora (campo precio o, si no hay, contenido)
+        habitacion, precio = _select_room_by_price(
+            habitaciones, variant['is_better'], variant['initial'])
 
-        for habitacion in habitaciones:
-            precio = habitacion.get('precio', 0)
-            if precio and precio > precio_max:
-                precio_max = precio
-                habitacion_cara = habitacion
-
-        # Si no hay precios directos, buscar en el contenido
-        if not habitacion_cara:
-            for habitacion in habitaciones:
-                contenido = habitacion['contenido'].lower()
-                precios = re.findall(r'\$\s*(\d+)', contenido)
-                for precio_str in precios:
-                    precio = float(precio_str)
-                    if precio > precio_max:
-                        precio_max = precio
-                        habitacion_cara = habitacion
-
-        if habitacion_cara:
-            response = "👑 **HABITACIÓN MÁS LUJOSA**\n"
-            response += "═" * 40 + "\n\n"
-            response += f"🏨 **{habitacion_cara['titulo']}**\n"
-            response += "─" * (len(habitacion_cara['titulo']) + 4) + "\n"
-            response += f"💎 **Precio:** ${precio_max:.0f} USD por noche\n\n"
-
-            # Obtener metadatos
-            metadatos = habitacion_cara.get('metadatos', {})
-            if metadatos:
-                response += "✨ **Características exclusivas:**\n"
-                for key, value in metadatos.items():
-                    if value:
-                        response += f"• **{key.title()}:** {value}\n"
-                response += "\n"
-
-            # Procesar descripción
-            contenido = habitacion_cara.get('contenido', '')
-            if contenido:
-                response += "📝 **Descripción premium:**\n"
-                lineas = contenido.split('\n')
-                for linea in lineas[:4]:  # Primeras 4 líneas para habitación premium
-                    linea = linea.strip()
-                    if linea and '$' not in linea:  # Evitar duplicar precio
-                        response += f"🌟 {linea}\n"
-                response += "\n"
-
-            response += "═" * 40 + "\n"
-            response += "🎉 **¡Experiencia de lujo!** Contacta recepción para reservar"
-
-            return response
-        else:
+        if not habitacion:
             return "🏠 **HABITACIONES**\n\nNo se encontraron precios disponibles."
 
+        titulo = habitacion['titulo']
+        parts = [
+            f"{variant['header']}\n",
+            "═" * 40 + "\n\n",
+            f"{variant['title_emoji']} **{titulo}**\n",
+            "─" * (len(titulo) + 4) + "\n",
+            f"{variant['price_emoji']} **Precio:** ${precio:.0f} USD por noche\n\n",
+        ]
+
+        # Obtener metadatos
+        metadatos = habitacion.get('metadatos', {})
+        if metadatos:
+            parts.append(f"{variant['features_title']}\n")
+            for key, value in metadatos.items():
+                if value:
+                    parts.append(f"• **{key.title()}:** {value}\n")
+            parts.append("\n")
+
+        # Procesar descripción
+        contenido = habitacion.get('contenido', '')
+        if contenido:
+            parts.append(f"{variant['description_title']}\n")
+            for linea in split_lines(contenido)[:variant['description_lines']]:
+                linea = linea.strip()
+                if linea and '$' not in linea:  # Evitar duplicar precio
+                    parts.append(f"{variant['line_emoji']} {linea}\n")
+            parts.append("\n")
+
+        parts.append("═" * 40 + "\n")
+        parts.append(variant['footer'])
+
+        return "".join(parts)
+
     except Exception as e:
-        logger.error(f"❌ Error obteniendo habitación más cara: {e}")
-        return "🏠 Error obteniendo información de habitaciones de lujo."
+        logger.error(f"❌ Error obteniendo {variant['log_label']}: {e}")
+        return variant['error_message']
 
 
 def get_rooms_with_prices() -> List[Dict[str, Any]]:
@@ -247,7 +241,7 @@ def get_rooms_with_prices() -> List[Dict[str, Any]]:
             # Si no hay precio directo, buscar en el contenido
             if not precio:
                 contenido = habitacion.get('contenido', '')
-                precios = re.findall(r'\$\s*(\d+)', contenido)
+                precios = _PRICE_RE.findall(contenido)
                 if precios:
                     precio = float(precios[0])
 
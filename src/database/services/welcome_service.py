@@ -1,40 +1,36 @@
 """
 Servicio especializado en respuestas de bienvenida inteligentes
 """
-from datetime import datetime
+from functools import lru_cache
 
+from database.repository import contenido_repository
 from database.services.basic_info_service import (
+    TIME_BUCKETS,
     get_contact_snippet_from_db,
     get_default_welcome,
     get_hotel_name_from_documents,
-    get_time_based_greeting,
+    get_time_bucket,
 )
 from utils.logger import logger
 
+# Plantilla de la bienvenida: solo se sustituyen las partes dinámicas
+_WELCOME_TEMPLATE = (
+    "{emoji} **{greeting}**\n\n"
+    "🏨 **¡Bienvenido a {hotel_name}!**\n\n"
+    "💫 {time_message}. Soy tu asistente virtual y estoy aquí para ayudarte.\n\n"
+    "🔍 **¿En qué puedo ayudarte hoy?**\n\n"
+    "{services}"
+    "{examples}"
+    "{contact}"
+)
+
 
 def get_smart_welcome_response(user_input: str = "") -> str:
     """Genera una respuesta de bienvenida inteligente usando datos de la BD"""
     try:
-        greeting = get_time_based_greeting()
-        hotel_name = get_hotel_name_from_documents()
-
-        # Emojis según la hora
-        emoji, time_message = _get_time_based_emoji_and_message()
-
-        response = f"{emoji} **{greeting}**\n\n"
-        response += f"🏨 **¡Bienvenido a {hotel_name}!**\n\n"
-        response += f"💫 {time_message}. Soy tu asistente virtual y estoy aquí para ayudarte.\n\n"
-
-        response += "🔍 **¿En qué puedo ayudarte hoy?**\n\n"
-        response += _get_services_section()
-        response += _get_examples_section()
-
-        # Agregar contacto rápido
-        contact_snippet = get_contact_snippet_from_db()
-        if contact_snippet:
-            response += f"📱 **Contacto directo:**\n{contact_snippet}"
-
-        return response
+        # La bienvenida solo cambia con la franja horaria o con el contenido
+        return _build_welcome(get_time_bucket(),
+                              contenido_repository.obtener_version_contenido())
 
     except Exception as e:
         logger.error(f"❌ Error generando bienvenida desde BD: {e}")
@@ -43,22 +39,24 @@ def get_smart_welcome_response(user_input: str = "") -> str:
 
 # ===== FUNCIONES AUXILIARES PRIVADAS =====
 
-def _get_time_based_emoji_and_message() -> tuple:
-    """Obtiene emoji y mensaje basado en la hora del día"""
-    now = datetime.now()
-    hour = now.hour
-
-    if 5 <= hour < 12:
-        emoji = "🌅"
-        time_message = "Esperamos que tengas un excelente día"
-    elif 12 <= hour < 18:
-        emoji = "☀️"
-        time_message = "Esperamos que estés teniendo una buena tarde"
-    else:
-        emoji = "🌙"
-        time_message = "Esperamos que tengas una agradable noche"
-
-    return emoji, time_message
+@lru_cache(maxsize=4)
+def _build_welcome(bucket: int, content_version: int) -> str:
+    """Construye la bienvenida de una franja horaria (memoizada por versión de contenido)"""
+    greeting, emoji, time_message = TIME_BUCKETS[bucket]
+
+    # Agregar contacto rápido
+    contact_snippet = get_contact_snippet_from_db()
+    contact = f"📱 **Contacto directo:**\n{contact_snippet}" if contact_snippet else ""
+
+    return _WELCOME_TEMPLATE.format(
+        emoji=emoji,
+        greeting=greeting,
+        hotel_name=get_hotel_name_from_documents(),
+        time_message=time_message,
+        services=_get_services_section(),
+        examples=_get_examples_section(),
+        contact=contact,
+    )
 
 
 def _get_services_section() -> str:
@@ -1,26 +1,28 @@
 import os
 import re
+from functools import lru_cache
 
 from config.settings import settings
 
+_HOTEL_NAME_RE = re.compile(r'(hotel|hostal|resort|posada|inn)', re.IGNORECASE)
 
+
+@lru_cache(maxsize=1)
 def get_hotel_name():
+    # Memoizado: la carpeta de documentos no cambia durante la sesión del bot
     documentos_dir = settings.DOCUMENTOS_DIR
-    posibles = []
-    for fname in os.listdir(documentos_dir):
-        if fname.endswith('.txt'):
-            with open(os.path.join(documentos_dir, fname), encoding='utf-8') as f:
-                for line in f:
-                    if re.search(r'(hotel|hostal|resort|posada|inn)', line, re.IGNORECASE):
-                        posibles.append(line.strip())
-                        break
-    if posibles:
-        return posibles[0]
-    # Si no encontró, intenta la primera línea del primer archivo
-    for fname in os.listdir(documentos_dir):
-        if fname.endswith('.txt'):
-            with open(os.path.join(documentos_dir, fname), encoding='utf-8') as f:
-                first = f.readline().strip()
-                if first:
-                    return first
-    return None 
\ No newline at end of file
+    # Una sola pasada con os.scandir: cada archivo se abre una vez y se
+    # retorna en cuanto aparece una línea con el nombre del hotel
+    primera_linea = None
+    with os.scandir(documentos_dir) as entries:
+        for entry in entries:
+            if not entry.name.endswith('.txt') or not entry.is_file():
+                continue
+            with open(entry.path, encoding='utf-8') as f:
+                for i, line in enumerate(f):
+                    if i == 0 and primera_linea is None and line.strip():
+                        primera_linea = line.strip()
+                    if _HOTEL_NAME_RE.search(line):
+                        return line.strip()
+    # Si no encontró, usa la primera línea no vacía del primer archivo
+    return primera_linea